@@ -0,0 +1,72 @@
+import cv2
+import numpy as np
+from PIL import Image
+from constants import BALLOON_PARAMS
+
+# Fracción de la caja que se recorta por cada lado para medir la tinta: el
+# texto está centrado y así no cuenta el dibujo que asoma por las esquinas
+INK_INSET = 0.15
+
+
+def to_gray(image):
+    """Imagen PIL o array (gris, RGB o RGBA) a array uint8 en gris."""
+    if isinstance(image, Image.Image):
+        return np.asarray(image.convert('L'))
+    array = np.asarray(image)
+    if array.ndim == 2:
+        return array.astype(np.uint8, copy=False)
+    code = cv2.COLOR_RGBA2GRAY if array.shape[2] == 4 else cv2.COLOR_RGB2GRAY
+    return cv2.cvtColor(array, code)
+
+
+def box_sums(integral, x1, y1, x2, y2):
+    """Suma de la imagen original dentro de cada caja [x1, x2) x [y1, y2), a partir de su cv2.integral."""
+    return integral[y2, x2] - integral[y1, x2] - integral[y2, x1] + integral[y1, x1]
+
+
+def detect_balloons(image, **overrides):
+    """
+    Detecta los globos de texto de un panel en una sola pasada.
+
+    Los globos son regiones claras y conexas con texto oscuro dentro: se
+    etiquetan las componentes conexas de los píxeles claros y se filtran todas
+    a la vez con NumPy por área, por cuánto de su caja ocupan y por la
+    densidad de tinta en el centro de la caja (con la imagen integral de los
+    píxeles oscuros, una consulta por caja). Los parámetros por defecto están
+    en BALLOON_PARAMS.
+
+    Devuelve [(x1, y1, x2, y2)] en píxeles de `image`, en orden de lectura.
+    """
+    params = dict(BALLOON_PARAMS, **overrides)
+    gray = to_gray(image)
+    height, width = gray.shape
+    panel_area = height * width
+
+    bright = (gray >= params['bright_threshold']).astype(np.uint8)
+    _, _, stats, _ = cv2.connectedComponentsWithStats(bright, connectivity=4)
+    # La etiqueta 0 son los píxeles oscuros
+    x, y, w, h, area = stats[1:].T.astype(np.int64)
+    box_area = w * h
+
+    keep = ((area >= params['min_area_ratio'] * panel_area)
+            & (box_area <= params['max_area_ratio'] * panel_area)
+            & (area >= params['min_fill'] * box_area))
+    x, y, w, h = x[keep], y[keep], w[keep], h[keep]
+    if not len(x):
+        return []
+
+    ink = cv2.integral((gray < params['ink_threshold']).astype(np.uint8))
+    ix1 = x + (w * INK_INSET).astype(np.int64)
+    iy1 = y + (h * INK_INSET).astype(np.int64)
+    ix2 = np.maximum(x + w - (w * INK_INSET).astype(np.int64), ix1 + 1)
+    iy2 = np.maximum(y + h - (h * INK_INSET).astype(np.int64), iy1 + 1)
+    ink_ratio = box_sums(ink, ix1, iy1, ix2, iy2) / ((ix2 - ix1) * (iy2 - iy1))
+    keep = (ink_ratio >= params['min_ink']) & (ink_ratio <= params['max_ink'])
+
+    margin = params['margin']
+    x1 = np.maximum(x[keep] - margin, 0)
+    y1 = np.maximum(y[keep] - margin, 0)
+    x2 = np.minimum(x[keep] + w[keep] + margin, width)
+    y2 = np.minimum(y[keep] + h[keep] + margin, height)
+    order = np.lexsort((x1, y1))
+    return [tuple(int(v) for v in box) for box in np.stack([x1, y1, x2, y2], axis=1)[order]]
@@ -0,0 +1,171 @@
+import os
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from tkinter import Toplevel, Label, Button, ttk
+from panel_recalculation import detect_panels
+from logger import logger
+from constants import DETECTION_WORKERS
+
+
+class BatchPanelDetector:
+    """
+    Recalcula los paneles de varias páginas con detect_panels en un
+    ProcessPoolExecutor (una página por tarea). Cada tarea recibe los bytes
+    de la página leídos del archivo, sin extraer nada a disco; sólo se leen
+    unas pocas páginas por delante de las que están en curso. Las páginas que
+    ya están en la caché de detección no llegan a enviarse a los procesos.
+
+    Los resultados se guardan con PanelManager.set_panels en el hilo de Tk a
+    medida que terminan, mientras una ventana muestra el progreso, el tiempo
+    restante y permite cancelar.
+    """
+
+    def __init__(self, root, panel_manager, pages, on_page_done=None, on_finished=None,
+                 workers=DETECTION_WORKERS, poll_ms=100):
+        self.root = root
+        self.panel_manager = panel_manager
+        num_pages = panel_manager.get_num_pages()
+        self.pages = [p for p in pages if 0 <= p < num_pages]
+        self.on_page_done = on_page_done
+        self.on_finished = on_finished
+        self.workers = workers or os.cpu_count() or 1
+        self.queued = deque(self.pages)
+        self.poll_ms = poll_ms
+        self.executor = None
+        self.futures = {}
+        self.completed = 0
+        self.errors = {}
+        self.cancelled = False
+        self.poll_id = None
+        self.start_time = None
+        self.batch_open = False
+        self.cache_hits_at_start = panel_manager.detection_cache.hits
+        # Camino que tomó cada página (XY-cut o contornos), para medir el atajo
+        self.paths = Counter()
+
+    def start(self):
+        if not self.pages:
+            self.finish()
+            return
+        self.create_progress_window()
+        self.start_time = time.perf_counter()
+
+        self.executor = ProcessPoolExecutor(max_workers=self.workers)
+        # Un solo guardado del .gui al terminar en lugar de uno por página
+        self.panel_manager.begin_batch()
+        self.batch_open = True
+        self.submit_pending()
+
+        logger.info(f"Batch panel detection started for {len(self.pages)} pages")
+        self.poll_id = self.root.after(self.poll_ms, self.poll)
+
+    def submit_pending(self):
+        # Dos tareas por proceso bastan para que ninguno espere y acotan la memoria
+        while self.queued and len(self.futures) < self.workers * 2:
+            page = self.queued.popleft()
+            try:
+                data = self.panel_manager.get_page_bytes(page)
+            except Exception as e:
+                logger.error(f"Error reading page {page + 1} for panel detection: {e}")
+                self.errors[page] = e
+                continue
+            key = self.panel_manager.detection_key(data)
+            panels = self.panel_manager.cached_detection(key)
+            if panels is not None:
+                # Página ya analizada con los mismos parámetros: no hace falta un proceso
+                self.store_result(page, panels)
+                continue
+            self.futures[self.executor.submit(detect_panels, data, self.panel_manager.detector_profile)] = (page, key)
+
+    def create_progress_window(self):
+        self.window = Toplevel(self.root)
+        self.window.title("Recalculando paneles")
+        self.window.resizable(False, False)
+        self.progress = ttk.Progressbar(self.window, length=360, mode='determinate', maximum=len(self.pages))
+        self.progress.pack(padx=10, pady=10)
+        self.status_label = Label(self.window, text=f"Preparando {len(self.pages)} páginas...", anchor='w')
+        self.status_label.pack(fill='x', padx=10)
+        Button(self.window, text="Cancelar", command=self.cancel).pack(pady=10)
+        self.window.protocol("WM_DELETE_WINDOW", self.cancel)
+
+    def poll(self):
+        self.poll_id = None
+        for future in [f for f in self.futures if f.done()]:
+            page, key = self.futures.pop(future)
+            if future.cancelled():
+                continue
+            try:
+                panels, path = future.result()
+            except Exception as e:
+                logger.error(f"Error recalculating panels for page {page + 1}: {e}")
+                self.errors[page] = e
+                continue
+            self.paths[path] += 1
+            logger.debug(f"Page {page + 1}: {len(panels)} panels via {path}")
+            self.panel_manager.store_detection(key, panels)
+            self.store_result(page, panels)
+
+        if not self.cancelled:
+            self.submit_pending()
+        self.update_progress()
+        if self.futures and not self.cancelled:
+            self.poll_id = self.root.after(self.poll_ms, self.poll)
+        else:
+            self.finish()
+
+    def store_result(self, page, panels):
+        self.panel_manager.set_panels(page, panels)
+        self.completed += 1
+        if self.on_page_done:
+            self.on_page_done(page, panels)
+
+    def update_progress(self):
+        done = self.completed + len(self.errors)
+        self.progress['value'] = done
+        elapsed = time.perf_counter() - self.start_time
+        text = f"Página {done} de {len(self.pages)}"
+        if self.completed:
+            remaining = elapsed / done * (len(self.pages) - done)
+            text += f" | {done / elapsed:.1f} págs/s | quedan ~{int(remaining) // 60}:{int(remaining) % 60:02d}"
+        if self.cache_hits:
+            text += f" | {self.cache_hits} desde caché"
+        if self.paths:
+            text += " | " + ", ".join(f"{path}: {count}" for path, count in sorted(self.paths.items()))
+        self.status_label.config(text=text)
+
+    @property
+    def cache_hits(self):
+        return self.panel_manager.detection_cache.hits - self.cache_hits_at_start
+
+    def cancel(self, wait=False):
+        """
+        Cancela las páginas pendientes. Con `wait` se espera además a que
+        terminen los procesos en curso (antes de cerrar el PanelManager).
+        """
+        if self.cancelled or self.executor is None:
+            return
+        self.cancelled = True
+        logger.info("Batch panel detection cancelled")
+        self.executor.shutdown(wait=wait, cancel_futures=True)
+        if self.poll_id is not None:
+            self.root.after_cancel(self.poll_id)
+            self.poll_id = None
+        self.finish()
+
+    def finish(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+        if self.batch_open:
+            self.batch_open = False
+            self.panel_manager.commit_batch()
+        if getattr(self, 'window', None) is not None and self.window.winfo_exists():
+            self.window.destroy()
+        if self.start_time is not None:
+            elapsed = time.perf_counter() - self.start_time
+            logger.info(f"Batch panel detection: {self.completed} pages in {elapsed:.1f}s, "
+                        f"{self.cache_hits} from detection cache, paths {dict(self.paths)}, {len(self.errors)} errors, "
+                        f"cancelled={self.cancelled}")
+        if self.on_finished:
+            self.on_finished(self)
+            self.on_finished = None
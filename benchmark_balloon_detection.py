@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+Compara la detección de áreas de texto anterior del editor de traducción
+(ampliar x2, umbral píxel a píxel con una lambda, una sola caja para todo el
+panel) con balloon_detection.detect_balloons: tiempo por panel y cuántos
+globos se encuentran (IoU >= --iou con la caja real del globo).
+
+Uso:
+    python benchmark_balloon_detection.py [panel.png ...] [--repeat 5]
+
+Sin argumentos se genera un panel sintético de 1000x1400 con trama gris y
+globos elípticos con texto, cuyas cajas se conocen. Con imágenes sólo se
+informa del tiempo y del número de áreas.
+"""
+
+import argparse
+import os
+import sys
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, REPO_DIR)
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+from balloon_detection import detect_balloons
+from benchmark_panel_detection import iou, timed
+
+
+def make_balloon_panel(size=(1000, 1400), balloons=6, seed=3):
+    """Panel con trama gris y globos elípticos con dos líneas de texto; devuelve (imagen, cajas de los globos)."""
+    rng = np.random.default_rng(seed)
+    w, h = size
+    image = Image.fromarray(rng.integers(60, 180, (h, w), dtype=np.uint8)).convert('RGB')
+    draw = ImageDraw.Draw(image)
+    try:
+        font = ImageFont.load_default(size=18)
+    except TypeError:
+        font = ImageFont.load_default()
+    boxes = []
+    columns, rows = 2, (balloons + 1) // 2
+    for i in range(balloons):
+        cx, cy = (i % columns) * w // columns, (i // columns) * h // rows
+        x1, y1 = cx + int(rng.integers(10, 60)), cy + int(rng.integers(10, 60))
+        x2, y2 = x1 + int(rng.integers(240, w // columns - 70)), y1 + int(rng.integers(120, h // rows - 70))
+        draw.ellipse((x1, y1, x2, y2), fill='white', outline='black', width=3)
+        for line, text in enumerate(('HELLO THERE', 'SAME AGAIN')):
+            draw.text((x1 + (x2 - x1) // 4, y1 + (y2 - y1) // 3 + line * 26), text, fill='black', font=font)
+        boxes.append((x1, y1, x2 + 1, y2 + 1))
+    return image, boxes
+
+
+def text_areas_previous(image):
+    """TranslationEditor.detect_text_areas tal como era antes de detect_balloons."""
+    img = image.resize((image.width * 2, image.height * 2), Image.LANCZOS)
+    bbox = img.convert('L').point(lambda x: 0 if x < 200 else 255, '1').getbbox()
+    return [bbox] if bbox else []
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de detección de globos de texto")
+    parser.add_argument('images', nargs='*', help="imágenes de paneles")
+    parser.add_argument('--repeat', type=int, default=5, help="repeticiones por panel (se toma la mejor)")
+    parser.add_argument('--iou', type=float, default=0.5, help="IoU mínimo para dar un globo por encontrado")
+    args = parser.parse_args()
+
+    if args.images:
+        panels = [(os.path.basename(path), Image.open(path).convert('RGB'), None) for path in args.images]
+    else:
+        image, truth = make_balloon_panel()
+        panels = [('sintético', image, truth)]
+
+    for name, image, truth in panels:
+        previous, t_previous = timed(lambda: text_areas_previous(image), args.repeat)
+        current, t_current = timed(lambda: detect_balloons(image), args.repeat)
+        print(f"{name}: {image.width}x{image.height}")
+        print(f"  anterior: {t_previous:.1f} ms, {len(previous)} área(s)")
+        text = f"  detect_balloons: {t_current:.1f} ms, {len(current)} áreas (x{t_previous / t_current:.1f})"
+        if truth is not None:
+            found = sum(any(iou(box, area) >= args.iou for area in current) for box in truth)
+            text += f", {found} de {len(truth)} globos con IoU >= {args.iou}"
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
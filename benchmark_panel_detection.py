@@ -0,0 +1,266 @@
+# -*- coding: utf-8 -*-
+"""
+Compara la detección de paneles a resolución completa con la detección sobre
+una copia reducida (recalcular_paneles con analysis_height): tiempo por página
+y coincidencia de los rectángulos (IoU medio y diferencias en el número de
+paneles).
+
+Uso:
+    python benchmark_panel_detection.py [páginas, carpetas o cómics .cbz/.cbr ...]
+                                        [--analysis-height 1200] [--repeat 3] [--limit 50]
+    python benchmark_panel_detection.py --contours [--repeat 20]
+    python benchmark_panel_detection.py --xycut [páginas, carpetas o cómics ...]
+
+Sin argumentos se genera un corpus sintético de páginas de 2800x4000.
+
+Con --contours se mide sólo el filtrado y orden de contornos sobre una página
+con trama ruidosa (miles de contornos), comparando la versión anterior
+(contourArea en una comprensión y boundingRect en la clave de orden) con
+filter_panel_contours.
+
+Con --xycut se compara detect_panels con el atajo XY-cut activado y sólo con
+contornos: camino que tomó cada página, tiempo e IoU entre ambos resultados.
+"""
+
+import argparse
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import zipfile
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, REPO_DIR)
+
+from constants import IMAGE_EXTENSIONS, PANEL_ANALYSIS_HEIGHT
+from panel_recalculation import recalcular_paneles, detect_panels, filter_panel_contours, PATH_XYCUT
+from utils import natural_sort_key, member_relpath
+
+
+def jittered_edges(rng, start, end, parts):
+    step = (end - start) / parts
+    inner = [int(start + step * k + rng.uniform(-step / 5, step / 5)) for k in range(1, parts)]
+    return [start] + inner + [end]
+
+
+def make_synthetic_pages(directory, pages=8, size=(2800, 4000), seed=1):
+    """Páginas con rejillas de paneles irregulares, algo de texto y ruido de escaneo."""
+    import numpy as np
+    from PIL import Image, ImageDraw, ImageFilter
+    rng = random.Random(seed)
+    paths = []
+    w, h = size
+    for i in range(pages):
+        image = Image.new('L', size, 245)
+        draw = ImageDraw.Draw(image)
+        rows = rng.randint(2, 4)
+        y_edges = jittered_edges(rng, 60, h - 60, rows)
+        for r in range(rows):
+            cols = rng.randint(1, 3)
+            x_edges = jittered_edges(rng, 60, w - 60, cols)
+            for c in range(cols):
+                x1, y1, x2, y2 = x_edges[c] + 25, y_edges[r] + 25, x_edges[c + 1] - 25, y_edges[r + 1] - 25
+                draw.rectangle((x1, y1, x2, y2), fill=rng.randint(170, 230), outline=0, width=10)
+                for _ in range(rng.randint(2, 6)):
+                    tx, ty = rng.randint(x1 + 40, max(x1 + 41, x2 - 200)), rng.randint(y1 + 40, max(y1 + 41, y2 - 60))
+                    draw.text((tx, ty), "TEXTO DE PRUEBA", fill=20)
+        noise = np.random.default_rng(seed + i).normal(0, 6, (h, w))
+        array = np.clip(np.asarray(image, dtype=np.float32) + noise, 0, 255).astype('uint8')
+        image = Image.fromarray(array).filter(ImageFilter.GaussianBlur(0.8)).convert('RGB')
+        path = os.path.join(directory, f'synthetic_{i + 1:03d}.jpg')
+        image.save(path, 'JPEG', quality=88)
+        paths.append(path)
+    return paths
+
+
+def extract_comic(comic_path, directory):
+    if comic_path.lower().endswith(('.cbr', '.rar')):
+        import rarfile
+        archive = rarfile.RarFile(comic_path)
+    else:
+        archive = zipfile.ZipFile(comic_path)
+    paths = []
+    with archive:
+        members = sorted((n for n in archive.namelist() if n.lower().endswith(IMAGE_EXTENSIONS)), key=natural_sort_key)
+        for member in members:
+            path = os.path.join(directory, os.path.basename(comic_path), member_relpath(member))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(archive.read(member))
+            paths.append(path)
+    return paths
+
+
+def collect_pages(inputs, directory):
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            for root, _, files in os.walk(item):
+                paths.extend(os.path.join(root, f) for f in sorted(files, key=natural_sort_key)
+                             if f.lower().endswith(IMAGE_EXTENSIONS))
+        elif item.lower().endswith(('.cbz', '.zip', '.cbr', '.rar')):
+            paths.extend(extract_comic(item, directory))
+        else:
+            paths.append(item)
+    return paths
+
+
+def iou(a, b):
+    ix = max(0, min(a[2], b[2]) - max(a[0], b[0]))
+    iy = max(0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = ix * iy
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def mean_best_iou(reference, candidate):
+    """IoU medio de cada panel de referencia con su mejor pareja (1.0 si ambos están vacíos)."""
+    if not reference and not candidate:
+        return 1.0
+    if not reference or not candidate:
+        return 0.0
+    return statistics.mean(max(iou(r, c) for c in candidate) for r in reference)
+
+
+def timed(func, repeat):
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return result, best * 1000
+
+
+def make_noisy_page(size=(840, 1200), seed=2):
+    """
+    Página con trama de puntos y grano de escaneo alrededor de cuatro paneles,
+    como un manga escaneado: cada punto y cada mota es un contorno externo.
+    Se genera ya al tamaño de análisis.
+    """
+    import numpy as np
+    rng = np.random.default_rng(seed)
+    w, h = size
+    page = np.full((h, w), 250, dtype=np.uint8)
+    page[::6, ::6] = 40
+    page[rng.random((h, w)) < 0.05] = 30
+    for y1, y2 in ((20, h // 3 - 10), (h // 3 + 10, 2 * h // 3 - 10)):
+        for x1, x2 in ((20, w // 2 - 10), (w // 2 + 10, w - 20)):
+            page[y1:y2, x1:x2] = 0
+            page[y1 + 4:y2 - 4, x1 + 4:x2 - 4] = 235
+    return page
+
+
+def filter_contours_previous(contours, min_area):
+    """Filtrado y orden tal como estaban antes de vectorizarlos."""
+    import cv2
+    valid_contours = [cnt for cnt in contours if cv2.contourArea(cnt) > min_area]
+    valid_contours.sort(key=lambda c: (cv2.boundingRect(c)[1], cv2.boundingRect(c)[0]))
+    return [cv2.boundingRect(c) for c in valid_contours]
+
+
+def run_contour_benchmark(args):
+    import cv2
+    import numpy as np
+    from panel_recalculation import detector_params
+    params = detector_params()
+    height = args.analysis_height or 4000
+    gray = make_noisy_page((round(height * 0.7), height))
+    thresh = cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY_INV,
+                                   params['block_size'], params['c'])
+    kernel = np.ones((params['kernel'], params['kernel']), np.uint8)
+    thresh = cv2.morphologyEx(thresh, cv2.MORPH_CLOSE, kernel)
+    contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    min_area = gray.shape[0] * gray.shape[1] * params['min_area_ratio']
+
+    previous, t_previous = timed(lambda: filter_contours_previous(contours, min_area), args.repeat)
+    current, t_current = timed(lambda: filter_panel_contours(contours, min_area), args.repeat)
+    same = [tuple(r) for r in current.tolist()] == [tuple(r) for r in previous]
+    print(f"Contornos: {len(contours)}  paneles: {len(current)}  "
+          f"(imagen analizada {gray.shape[1]}x{gray.shape[0]})")
+    print(f"Anterior: {t_previous:.2f} ms  Vectorizado: {t_current:.2f} ms  "
+          f"(x{t_previous / t_current:.1f})  mismo resultado: {'sí' if same else 'NO'}")
+
+
+def run_xycut_benchmark(pages, args):
+    by_path = {}
+    contour_ms, ious = [], []
+    print(f"{'página':<32} {'camino':>10} {'con atajo':>10} {'contornos':>10} {'IoU':>6}")
+    for path in pages:
+        with open(path, 'rb') as f:
+            data = f.read()
+        (panels, taken), t_fast = timed(lambda: detect_panels(data), args.repeat)
+        (reference, _), t_contours = timed(lambda: detect_panels(data, xycut_confidence=None), args.repeat)
+        by_path.setdefault(taken, []).append(t_fast)
+        contour_ms.append(t_contours)
+        ious.append(mean_best_iou(reference, panels))
+        print(f"{os.path.basename(path)[-32:]:<32} {taken:>10} {t_fast:>8.1f}ms {t_contours:>8.1f}ms {ious[-1]:>6.3f}")
+
+    print()
+    for taken, times in sorted(by_path.items()):
+        print(f"{taken}: {len(times)} páginas, {statistics.mean(times):.1f} ms/página")
+    total_fast = sum(sum(times) for times in by_path.values())
+    print(f"Sólo contornos: {statistics.mean(contour_ms):.1f} ms/página  "
+          f"con atajo: {total_fast / len(pages):.1f} ms/página  "
+          f"(x{sum(contour_ms) / total_fast:.2f})")
+    print(f"IoU medio frente a contornos: {statistics.mean(ious):.3f}  "
+          f"páginas por XY-cut: {len(by_path.get(PATH_XYCUT, []))} de {len(pages)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de detección de paneles reducida vs. completa")
+    parser.add_argument('inputs', nargs='*', help="imágenes, carpetas o cómics .cbz/.cbr")
+    parser.add_argument('--analysis-height', type=int, default=PANEL_ANALYSIS_HEIGHT or 1200)
+    parser.add_argument('--repeat', type=int, default=3, help="repeticiones por página (se toma la mejor)")
+    parser.add_argument('--limit', type=int, default=None, help="máximo de páginas")
+    parser.add_argument('--contours', action='store_true',
+                        help="medir sólo el filtrado de contornos en una página ruidosa")
+    parser.add_argument('--xycut', action='store_true',
+                        help="comparar el atajo XY-cut con el camino de contornos")
+    args = parser.parse_args()
+
+    if args.contours:
+        run_contour_benchmark(args)
+        return
+
+    workdir = tempfile.mkdtemp(prefix='panel_bench_')
+    try:
+        pages = collect_pages(args.inputs, workdir) if args.inputs else make_synthetic_pages(workdir)
+        pages = pages[:args.limit] if args.limit else pages
+        if not pages:
+            print("No se encontraron páginas")
+            return
+        if args.xycut:
+            run_xycut_benchmark(pages, args)
+            return
+
+        full_ms, reduced_ms, ious, count_diffs = [], [], [], 0
+        print(f"{'página':<32} {'completa':>10} {'reducida':>10} {'paneles':>9} {'IoU':>6}")
+        for path in pages:
+            full, t_full = timed(lambda: recalcular_paneles(path, analysis_height=None), args.repeat)
+            reduced, t_reduced = timed(lambda: recalcular_paneles(path, analysis_height=args.analysis_height),
+                                       args.repeat)
+            page_iou = mean_best_iou(full, reduced)
+            full_ms.append(t_full)
+            reduced_ms.append(t_reduced)
+            ious.append(page_iou)
+            count_diffs += len(full) != len(reduced)
+            print(f"{os.path.basename(path)[-32:]:<32} {t_full:>8.1f}ms {t_reduced:>8.1f}ms "
+                  f"{len(full):>4}/{len(reduced):<4} {page_iou:>6.3f}")
+
+        print()
+        print(f"Páginas: {len(pages)}  altura de análisis: {args.analysis_height}px")
+        print(f"Completa: {statistics.mean(full_ms):.1f} ms/página  "
+              f"Reducida: {statistics.mean(reduced_ms):.1f} ms/página  "
+              f"(x{statistics.mean(full_ms) / statistics.mean(reduced_ms):.1f})")
+        print(f"IoU medio: {statistics.mean(ious):.3f}  mínimo: {min(ious):.3f}  "
+              f"páginas con distinto nº de paneles: {count_diffs}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""
+Compara el pico de memoria (RSS) y el tiempo del renderizado anterior
+(copy() + thumbnail() de la página y crop() + thumbnail() por panel) con el
+actual (PanelManager.render_region sobre la pirámide de la caché).
+
+Uso:
+    python benchmark_render_memory.py [comic.cbz] [--cache-mb 64]
+
+Sin archivo se genera un cómic sintético con páginas de 3000x4500. Cada modo
+se ejecuta en un proceso aparte para que el pico de RSS no se mezcle.
+
+Por defecto las cachés del modo nuevo son mínimas para medir sólo el coste del
+renderizado. Con los presupuestos de constants.py el pico crece hasta lo que
+las cachés retienen a propósito (PAGE_CACHE_MB + RENDER_CACHE_MB).
+"""
+
+import argparse
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+# Tamaños de lienzo que se recorren, como al arrastrar el borde de la ventana
+CANVAS_SIZES = [(1000 + 40 * i, 800 + 30 * i) for i in range(10)]
+# Rejilla de 3x2 paneles en coordenadas relativas
+PANEL_GRID = [(c / 2, r / 3, (c + 1) / 2, (r + 1) / 3) for r in range(3) for c in range(2)]
+
+
+def peak_rss_mb():
+    # En Linux ru_maxrss se hereda del proceso padre; VmHWM empieza de cero con exec
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1048576 if sys.platform == 'darwin' else peak / 1024
+    except ImportError:
+        try:
+            import psutil
+            return psutil.Process().memory_info().peak_wset / 1048576
+        except (ImportError, AttributeError):
+            return float('nan')
+
+
+def make_synthetic_comic(path, pages=6, size=(3000, 4500)):
+    from PIL import Image, ImageDraw
+    with zipfile.ZipFile(path, 'w') as zf:
+        for i in range(pages):
+            image = Image.linear_gradient('L').resize(size).convert('RGB')
+            draw = ImageDraw.Draw(image)
+            for x1, y1, x2, y2 in PANEL_GRID:
+                draw.rectangle((x1 * size[0] + 20, y1 * size[1] + 20, x2 * size[0] - 20, y2 * size[1] - 20),
+                               outline='black', width=12)
+            buffer = io.BytesIO()
+            image.save(buffer, 'JPEG', quality=90)
+            zf.writestr(f'page{i + 1:03d}.jpg', buffer.getvalue())
+
+
+def panels_for(size):
+    w, h = size
+    return [(int(x1 * w), int(y1 * h), int(x2 * w), int(y2 * h)) for x1, y1, x2, y2 in PANEL_GRID]
+
+
+def run_old(comic_path, cache_mb, render_cache_mb):
+    from PIL import Image
+    from panel_manager import PanelManager
+    pm = PanelManager(comic_path, cache_mb=cache_mb)
+    baseline = peak_rss_mb()
+    start = time.perf_counter()
+    for page in range(pm.get_num_pages()):
+        current_image = Image.open(io.BytesIO(pm.get_page_bytes(page)))
+        for size in CANVAS_SIZES:
+            img = current_image.copy()
+            img.thumbnail(size, Image.LANCZOS)
+        for panel in panels_for(current_image.size):
+            for size in CANVAS_SIZES[:2]:
+                img = current_image.crop(panel)
+                img.thumbnail(size, Image.LANCZOS)
+    return baseline, time.perf_counter() - start
+
+
+def run_new(comic_path, cache_mb, render_cache_mb):
+    from panel_manager import PanelManager
+    pm = PanelManager(comic_path, cache_mb=cache_mb, render_cache_mb=render_cache_mb)
+    baseline = peak_rss_mb()
+    start = time.perf_counter()
+    for page in range(pm.get_num_pages()):
+        for size in CANVAS_SIZES:
+            pm.render_region(page, None, size)
+        full_size = pm.get_page_image(page).size
+        for panel in panels_for(full_size):
+            for size in CANVAS_SIZES[:2]:
+                pm.render_region(page, panel, size)
+    return baseline, time.perf_counter() - start
+
+
+def run_child(mode, comic_path, cache_mb, render_cache_mb):
+    sys.path.insert(0, REPO_DIR)
+    baseline, seconds = (run_old if mode == 'old' else run_new)(comic_path, cache_mb, render_cache_mb)
+    print(json.dumps({'baseline_mb': baseline, 'peak_mb': peak_rss_mb(), 'seconds': seconds}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('comic', nargs='?', help='CBZ/CBR a usar (por defecto uno sintético)')
+    parser.add_argument('--cache-mb', type=float, default=8, help='presupuesto de la caché de páginas')
+    parser.add_argument('--render-cache-mb', type=float, default=4, help='presupuesto de la caché de renderizado')
+    parser.add_argument('--mode', choices=['old', 'new'], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        run_child(args.mode, args.comic, args.cache_mb, args.render_cache_mb)
+        return
+
+    with tempfile.TemporaryDirectory() as workdir:
+        comic_path = os.path.abspath(args.comic) if args.comic else os.path.join(workdir, 'synthetic.cbz')
+        if not args.comic:
+            make_synthetic_comic(comic_path)
+        results = {}
+        for mode in ('old', 'new'):
+            # Se ejecuta en el directorio temporal: PanelManager crea ahí logs y caché
+            out = subprocess.run([sys.executable, os.path.abspath(__file__), comic_path, '--mode', mode,
+                                  '--cache-mb', str(args.cache_mb), '--render-cache-mb', str(args.render_cache_mb)],
+                                 cwd=workdir, capture_output=True, text=True, check=True)
+            results[mode] = json.loads(out.stdout.strip().splitlines()[-1])
+
+    print(f"{'modo':<8}{'RSS base (MB)':>16}{'RSS pico (MB)':>16}{'incremento (MB)':>18}{'tiempo (s)':>12}")
+    for mode, label in (('old', 'antes'), ('new', 'después')):
+        r = results[mode]
+        print(f"{label:<8}{r['baseline_mb']:>16.1f}{r['peak_mb']:>16.1f}"
+              f"{r['peak_mb'] - r['baseline_mb']:>18.1f}{r['seconds']:>12.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -11,10 +11,15 @@ from tkinter import *
 from tkinter import ttk, messagebox, simpledialog, filedialog
 from PIL import Image, ImageTk
 from panel_manager import PanelManager
+from prefetch import PagePrefetcher
+from render_scheduler import RenderScheduler
 from panel_editor import PanelEditor
 from panel_order_editor import PanelOrderEditor
-from panel_recalculation import recalcular_paneles
+from panel_recalculation import detect_panels
+from batch_detection import BatchPanelDetector
+from ocr_pipeline import ComicOcrPipeline
 from utils import ensure_directory_exists
+from constants import DETECTOR_PROFILES
 from state_manager import save_state, load_state
 from translation_manager import TranslationManager
 from translation_configurator import TranslationConfiguratorApp
@@ -64,9 +69,16 @@ class ComicViewer:
         self.translations = {}
         
         self.panel_manager = None
+        self.prefetcher = None
+        self.ocr_pipeline = None
+        self.batch_detector = None
     
         self.panel_images = []
         self.current_image = None
+        self.current_image_page = None
+        self.screen_image = None
+        self.last_canvas_size = None
+        self.render_scheduler = RenderScheduler(self.root, self.render_canvas)
         self.canvas.bind('<Configure>', self.on_resize)
         
         self.translation_manager = TranslationManager(self, self.panel_manager)
@@ -175,6 +187,10 @@ class ComicViewer:
         self.toggle_button.pack(fill=X)
         self.recalc_button = Button(self.button_frame, text="Recalcular Paneles", command=self.recalculate_panels)
         self.recalc_button.pack(fill=X)
+        self.detector_profile_button = Button(self.button_frame, text="Perfil de Detección", command=self.choose_detector_profile)
+        self.detector_profile_button.pack(fill=X)
+        self.comic_ocr_button = Button(self.button_frame, text="OCR del Cómic", command=self.run_comic_ocr)
+        self.comic_ocr_button.pack(fill=X)
         self.reorder_button = Button(self.button_frame, text="Reordenar Paneles", command=self.reorder_panels)
         self.reorder_button.pack(fill=X)
         self.delete_panel_button = Button(self.button_frame, text="Borrar Panel", command=self.delete_current_panel)
@@ -452,7 +468,7 @@ class ComicViewer:
 
     @log_function
     def display_panel(self):
-        if self.current_image is None:
+        if self.load_current_image() is None:
             logger.error("Cannot display panel: current_image is None")
             messagebox.showerror("Error", "No se pudo cargar la imagen de la página actual")
             return
@@ -472,12 +488,14 @@ class ComicViewer:
         x1, y1, x2, y2 = panel
     
         try:
-            img = self.current_image.crop((x1, y1, x2, y2))
-    
-            canvas_width = self.canvas.winfo_width()
-            canvas_height = self.canvas.winfo_height()
-    
-            img.thumbnail((canvas_width, canvas_height), Image.LANCZOS)
+            canvas_width, canvas_height = self.canvas_size()
+    
+            img = self.panel_manager.render_region(self.current_page, panel, (canvas_width, canvas_height))
+            if img is None:
+                # Panel fuera de la página: no hay nada que mostrar
+                self.canvas.delete("all")
+                self.update_info_label()
+                return
             self.photo = ImageTk.PhotoImage(img)
     
             self.canvas.delete("all")
@@ -485,6 +503,7 @@ class ComicViewer:
             self.canvas.config(scrollregion=self.canvas.bbox(ALL))
     
             self.update_info_label()
+            self.prefetcher.schedule(self.current_page)
     
             logger.info(f"Successfully displayed panel {self.current_panel + 1} for page {self.current_page + 1}")
         except Exception as e:
@@ -495,7 +514,7 @@ class ComicViewer:
 
     @log_function  
     def show_panels(self):
-        if self.current_image is None:
+        if self.load_current_image() is None:
             logger.error("Cannot show panels: current_image is None")
             messagebox.showerror("Error", "No se pudo cargar la imagen de la página actual")
             return
@@ -513,23 +532,56 @@ class ComicViewer:
 
 
 
+    def close(self):
+        """Detiene la precarga, la detección y el OCR por lotes y compacta las correcciones del cómic abierto."""
+        if self.batch_detector:
+            # Lo ya detectado se guarda al cerrar el lote, antes de cerrar el cómic
+            self.batch_detector.on_page_done = None
+            self.batch_detector.on_finished = None
+            self.batch_detector.cancel(wait=True)
+            self.batch_detector = None
+        if self.ocr_pipeline:
+            # Lo ya reconocido queda en el almacén; no hace falta avisar
+            self.ocr_pipeline.on_finished = None
+            self.ocr_pipeline.cancel()
+            self.ocr_pipeline = None
+        if self.prefetcher:
+            self.prefetcher.shutdown()
+            self.prefetcher = None
+        if self.panel_manager:
+            self.panel_manager.close()
+
 ######################
     @log_function
-    def load_comic(self, file_path=None, page=0, panel=0, viewing_panels=False):
+    def load_comic(self, file_path=None, page=None, panel=0, viewing_panels=False):
         if file_path is None:
             file_path = filedialog.askopenfilename(filetypes=[("Comic files", "*.cbz *.cbr")])
         
         if file_path:
             logger.info(f"Attempting to load comic: {file_path}")
+            reopening = (self.panel_manager is not None and
+                         os.path.abspath(self.panel_manager.input_file) == os.path.abspath(file_path))
             try:
-                self.panel_manager = PanelManager(file_path)
+                if reopening:
+                    # El mismo cómic: sus correcciones se compactan antes de volver a leerlas
+                    self.close()
+                    self.panel_manager = None
+                panel_manager = PanelManager(file_path)
+                # El cómic anterior sólo se cierra si el nuevo se ha abierto bien
+                self.close()
+                self.panel_manager = panel_manager
+                self.prefetcher = PagePrefetcher(self.root, self.panel_manager)
+                if page is None:
+                    page = 0
+                elif panel_manager.legacy_page_map is not None:
+                    # La página guardada de la sesión anterior usa el orden antiguo del .gui
+                    page = panel_manager.legacy_page_map.get(int(page), int(page))
                 self.current_page = int(page)
                 self.current_panel = int(panel)
                 self.viewing_panels = bool(viewing_panels)
                 logger.info(f"Setting initial state: Page {self.current_page + 1}, Panel {self.current_panel + 1}, Viewing panels: {self.viewing_panels}")
                 
-                image_path = self.panel_manager.get_page_path(self.current_page)
-                self.current_image = Image.open(image_path)
+                self.current_image = None
                 
                 if self.viewing_panels:
                     self.show_panels()
@@ -557,9 +609,13 @@ class ComicViewer:
             logger.debug(f"Panel images in show_page: {self.panel_images}")
             self.update_info_label()
             try:
-                image_path = self.panel_manager.get_page_path(page_index)
-                self.current_image = Image.open(image_path)
-                self.display_image(self.current_image)
+                # La resolución completa se decodifica sólo si se piden paneles u OCR
+                self.render_scheduler.cancel()
+                self.current_image = None
+                box = self.canvas_size()
+                self.screen_image = self.prefetcher.get_screen_image(page_index, box)
+                self.fit_image()
+                self.prefetcher.schedule(page_index, box)
                 save_state(self.panel_manager.input_file, self.current_page, self.current_panel, self.viewing_panels)
             except Exception as e:
                 logger.error(f"Error showing page {page_index + 1}: {str(e)}", exc_info=True)
@@ -572,6 +628,22 @@ class ComicViewer:
                     logger.error("No se pudo encontrar una página válida para mostrar")
                     messagebox.showerror("Error", "No se pudo encontrar una página válida para mostrar")
     
+    def canvas_size(self):
+        canvas_width = self.canvas.winfo_width()
+        canvas_height = self.canvas.winfo_height()
+        if canvas_width <= 1 or canvas_height <= 1:
+            self.root.update_idletasks()
+            canvas_width = self.canvas.winfo_width()
+            canvas_height = self.canvas.winfo_height()
+        return max(1, canvas_width), max(1, canvas_height)
+
+    def load_current_image(self):
+        """Página actual a resolución completa, decodificada sólo cuando hace falta."""
+        if self.panel_manager and (self.current_image is None or self.current_image_page != self.current_page):
+            self.current_image = self.prefetcher.get_screen_image(self.current_page)
+            self.current_image_page = self.current_page
+        return self.current_image
+
     @log_function
     def display_image(self, image):
         try:
@@ -619,13 +691,20 @@ class ComicViewer:
         
 
     def on_resize(self, event):
-        if self.panel_manager:
-            if self.viewing_panels:
-                self.draw_panels()
-            else:
-                self.fit_image()
+        size = (event.width, event.height)
+        if self.panel_manager and size != self.last_canvas_size:
+            self.last_canvas_size = size
+            self.render_scheduler.request()
         logger.debug(f"Canvas resized to {event.width}x{event.height}")
 
+    def render_canvas(self, resample=Image.LANCZOS):
+        if not self.panel_manager:
+            return
+        if self.viewing_panels:
+            self.draw_panels()
+        else:
+            self.fit_image(resample)
+
     def draw_panels(self):
         self.canvas.delete('panel')
         for i, (x1, y1, x2, y2) in enumerate(self.panel_images):
@@ -637,8 +716,7 @@ class ComicViewer:
         logger.info("Removing zero-size panels")
         original_count = len(self.panel_images)
         self.panel_images = [(x1, y1, x2, y2) for x1, y1, x2, y2 in self.panel_images if (x2 - x1) > 0 and (y2 - y1) > 0]
-        self.panel_manager.panel_corrections[self.current_page] = self.panel_images
-        self.panel_manager.save_gui_file()
+        self.panel_manager.set_panels(self.current_page, self.panel_images)
         removed_count = original_count - len(self.panel_images)
         logger.info(f"Removed {removed_count} zero-size panels")
         messagebox.showinfo("Panels Removed", f"{removed_count} zero-size panels were removed.")
@@ -648,8 +726,7 @@ class ComicViewer:
         if self.panel_images:
             logger.info(f"Deleting panel {self.current_panel}")
             del self.panel_images[self.current_panel]
-            self.panel_manager.panel_corrections[self.current_page] = self.panel_images
-            self.panel_manager.save_gui_file()
+            self.panel_manager.set_panels(self.current_page, self.panel_images)
             if self.current_panel >= len(self.panel_images):
                 self.current_panel = len(self.panel_images) - 1
             if self.panel_images:
@@ -661,8 +738,7 @@ class ComicViewer:
     def save_new_order(self, new_order):
         logger.info("Saving new panel order")
         reordered_panels = [self.panel_images[i] for i in new_order]
-        self.panel_manager.panel_corrections[self.current_page] = reordered_panels
-        self.panel_manager.save_gui_file()
+        self.panel_manager.set_panels(self.current_page, reordered_panels)
         self.panel_images = reordered_panels
         self.refresh_panels()
         logger.info("New panel order saved and applied")
@@ -673,13 +749,13 @@ class ComicViewer:
         total_pages = self.panel_manager.get_num_pages()
         for i in range(current_page + 1, total_pages):
             try:
-                self.panel_manager.get_page_path(i)
+                self.panel_manager.get_page_bytes(i)
                 return i
             except Exception:
                 continue
         for i in range(current_page - 1, -1, -1):
             try:
-                self.panel_manager.get_page_path(i)
+                self.panel_manager.get_page_bytes(i)
                 return i
             except Exception:
                 continue
@@ -688,9 +764,8 @@ class ComicViewer:
     @log_function  
     def _recalculate_remaining_pages(self, start_page):
         total_pages = self.panel_manager.get_num_pages()
-        for page in range(start_page, total_pages):
-            self._recalculate_single_page(page)
-        messagebox.showinfo("Recálculo completado", f"Se han recalculado los paneles de las páginas {start_page + 1} a {total_pages}.")
+        self._recalculate_pages_in_batch(range(start_page, total_pages),
+                                         f"Se han recalculado los paneles de las páginas {start_page + 1} a {total_pages}.")
     
     @log_function      
     def _recalculate_specific_pages(self):
@@ -698,18 +773,67 @@ class ComicViewer:
                                             "Alimente páginas con el formato: 1,3,4-8,10,11-12,15")
         if page_input:
             pages_to_recalculate = self._parse_page_input(page_input)
-            for page in pages_to_recalculate:
-                self._recalculate_single_page(page - 1)
-            messagebox.showinfo("Recálculo completado", f"Se han recalculado los paneles de las siguientes páginas: {page_input}")
+            self._recalculate_pages_in_batch([page - 1 for page in pages_to_recalculate],
+                                             f"Se han recalculado los paneles de las siguientes páginas: {page_input}")
         else:
             logger.info("User cancelled specific page recalculation")
     
+    @log_function
+    def _recalculate_pages_in_batch(self, pages, done_message):
+        def on_page_done(page, panels):
+            if page == self.current_page:
+                self.refresh_panels()
+
+        def on_finished(detector):
+            self.batch_detector = None
+            self.refresh_panels()
+            if detector.cancelled:
+                messagebox.showinfo("Recálculo cancelado", f"Se recalcularon {detector.completed} páginas antes de cancelar.")
+            elif detector.errors:
+                failed = ', '.join(str(page + 1) for page in sorted(detector.errors))
+                messagebox.showwarning("Recálculo completado", f"{done_message}\nNo se pudieron recalcular las páginas: {failed}")
+            else:
+                messagebox.showinfo("Recálculo completado", done_message)
+
+        if self.batch_detector:
+            return
+        self.batch_detector = BatchPanelDetector(self.root, self.panel_manager, pages, on_page_done, on_finished)
+        self.batch_detector.start()
+
+    def run_comic_ocr(self):
+        """OCR de todos los paneles en segundo plano; continúa donde se quedó la última vez."""
+        if not self.panel_manager or self.ocr_pipeline:
+            return
+
+        def on_finished(pipeline):
+            self.ocr_pipeline = None
+            if pipeline.cancelled.is_set():
+                messagebox.showinfo("OCR cancelado", f"Se procesaron {pipeline.completed} paneles. "
+                                    "El OCR continuará desde aquí la próxima vez.")
+            elif not pipeline.total:
+                messagebox.showinfo("OCR del cómic", "Todos los paneles tienen ya su OCR.")
+            elif pipeline.errors:
+                messagebox.showwarning("OCR completado", f"OCR de {pipeline.completed} paneles; "
+                                       f"fallaron {pipeline.errors}.")
+            else:
+                messagebox.showinfo("OCR completado", f"OCR de {pipeline.completed} paneles.")
+
+        self.ocr_pipeline = ComicOcrPipeline(self.root, self.panel_manager, on_finished)
+        self.ocr_pipeline.start()
+
     @log_function      
     def _recalculate_single_page(self, page):
         logger.info(f"Recalculating panels for page {page + 1}")
         try:
-            page_path = self.panel_manager.get_page_path(page)
-            new_panels = recalcular_paneles(page_path)
+            data = self.panel_manager.get_page_bytes(page)
+            key = self.panel_manager.detection_key(data)
+            new_panels = self.panel_manager.cached_detection(key)
+            if new_panels is None:
+                # Si la página ya está decodificada no se vuelve a decodificar
+                source = self.current_image if page == self.current_image_page and self.current_image is not None else data
+                new_panels, path = detect_panels(source, self.panel_manager.detector_profile)
+                logger.info(f"Page {page + 1} detected via {path}")
+                self.panel_manager.store_detection(key, new_panels)
             self.panel_manager.set_panels(page, new_panels)
             self.refresh_panels()
             logger.info(f"Panels recalculated for page {page + 1}. New panel count: {len(new_panels)}")
@@ -717,6 +841,27 @@ class ComicViewer:
             logger.error(f"Error recalculating panels for page {page + 1}: {str(e)}", exc_info=True)
             messagebox.showerror("Error", f"No se pudieron recalcular los paneles de la página {page + 1}: {str(e)}")
     
+    @log_function
+    def choose_detector_profile(self):
+        if not self.panel_manager:
+            messagebox.showwarning("No hay cómic cargado", "Por favor, cargue un cómic antes de elegir el perfil de detección.")
+            return
+
+        window = Toplevel(self.root)
+        window.title("Perfil de detección")
+        window.transient(self.root)
+        Label(window, text="Perfil para recalcular los paneles de este cómic:").pack(padx=10, pady=(10, 5))
+        profile_var = StringVar(value=self.panel_manager.detector_profile)
+        combo = ttk.Combobox(window, textvariable=profile_var, values=list(DETECTOR_PROFILES), state='readonly')
+        combo.pack(padx=10, pady=5)
+
+        def save_profile():
+            self.panel_manager.set_detector_profile(profile_var.get())
+            window.destroy()
+
+        Button(window, text="Guardar", command=save_profile).pack(side=LEFT, padx=10, pady=10)
+        Button(window, text="Cancelar", command=window.destroy).pack(side=RIGHT, padx=10, pady=10)
+
     @log_function  
     def recalculate_panels(self):
         logger.info("Starting panel recalculation process")
@@ -778,8 +923,9 @@ class ComicViewer:
     @log_function    
     def _reorder_remaining_pages_automatically(self, start_page):
         total_pages = self.panel_manager.get_num_pages()
-        for page in range(start_page, total_pages):
-            self._reorder_single_page_automatically(page)
+        with self.panel_manager.batch():
+            for page in range(start_page, total_pages):
+                self._reorder_single_page_automatically(page)
         messagebox.showinfo("Reordenamiento completado", f"Se han reordenado automáticamente los paneles de las páginas {start_page + 1} a {total_pages}.")
     
     @log_function    
@@ -788,8 +934,9 @@ class ComicViewer:
                                             "Ingrese las páginas a reordenar (ejemplo: 1,3,4-8,10,11-12,15):")
         if page_input:
             pages_to_reorder = self._parse_page_input(page_input)
-            for page in pages_to_reorder:
-                self._reorder_single_page_automáticamente(page - 1)
+            with self.panel_manager.batch():
+                for page in pages_to_reorder:
+                    self._reorder_single_page_automáticamente(page - 1)
             messagebox.showinfo("Reordenamiento completado", f"Se han reordenado automáticamente los paneles de las siguientes páginas: {page_input}")
         else:
             logger.info("User cancelled specific page reordering")
@@ -818,12 +965,13 @@ class ComicViewer:
     @log_function  
     def reorder_remaining_pages(self):
         num_pages = self.panel_manager.get_num_pages()
-        for page in range(self.current_page, num_pages):
-            panels = self.panel_manager.get_panels(page)
-            if panels:
-                panels.sort(key=lambda p: (p[1], p[0]))
-                self.panel_manager.set_panels(page, panels)
-                logger.info(f"Reordenados paneles en página {page + 1}")
+        with self.panel_manager.batch():
+            for page in range(self.current_page, num_pages):
+                panels = self.panel_manager.get_panels(page)
+                if panels:
+                    panels.sort(key=lambda p: (p[1], p[0]))
+                    self.panel_manager.set_panels(page, panels)
+                    logger.info(f"Reordenados paneles en página {page + 1}")
         self.load_image()
         messagebox.showinfo("Reordenar", "Se han reordenado todas las hojas remanentes automáticamente.")
     
@@ -876,11 +1024,12 @@ class ComicViewer:
     def _reorder_remaining_pages(self, start_page):
         logger.info(f"Reordering remaining pages starting from page {start_page + 1}")
         total_pages = self.panel_manager.get_num_pages()
-        for page in range(start_page, total_pages):
-            panels = self.panel_manager.get_panels(page)
-            if panels:
-                sorted_panels = sorted(panels, key=lambda p: (p[1], p[0]))
-                self._save_new_order(page, sorted_panels)
+        with self.panel_manager.batch():
+            for page in range(start_page, total_pages):
+                panels = self.panel_manager.get_panels(page)
+                if panels:
+                    sorted_panels = sorted(panels, key=lambda p: (p[1], p[0]))
+                    self._save_new_order(page, sorted_panels)
         
         messagebox.showinfo("Reordenamiento completado", f"Se han reordenado los paneles de las páginas {start_page + 1} a {total_pages}.")
         self.refresh_panels()
@@ -933,7 +1082,7 @@ class ComicViewer:
     
     @log_function
     def start_translation(self):
-        if self.viewing_panels and self.current_image:
+        if self.viewing_panels and self.load_current_image():
             panel_image = self.get_current_panel_image()
             # translation_editor = TranslationEditor(self.root, self, panel_image, self.current_page, self.current_panel, self.panel_manager.input_file, self.translation_config)
             translation_editor = TranslationEditor(
@@ -954,30 +1103,21 @@ class ComicViewer:
 
     @log_function    
     def get_current_panel_image(self):
-        if self.viewing_panels and self.current_image:
+        if self.viewing_panels and self.load_current_image():
             panel = self.panel_images[self.current_panel]
             x1, y1, x2, y2 = panel
             return self.current_image.crop((x1, y1, x2, y2))
         return None
     
     @log_function
-    def fit_image(self):
-        if self.current_image:
+    def fit_image(self, resample=Image.LANCZOS):
+        if self.panel_manager and self.screen_image is not None:
             logger.debug("Fitting image to canvas")
-            canvas_width = self.canvas.winfo_width()
-            canvas_height = self.canvas.winfo_height()
-            img_ratio = self.current_image.width / self.current_image.height
-            canvas_ratio = canvas_width / canvas_height
-    
-            if (img_ratio > canvas_ratio):
-                width = canvas_width
-                height = int(width / img_ratio)
-            else:
-                height = canvas_height
-                width = int(height * img_ratio)
-    
-            img = self.current_image.copy()
-            img.thumbnail((width, height), Image.LANCZOS)
+            canvas_width, canvas_height = self.canvas_size()
+            # Si el lienzo creció puede hacer falta un nivel de más resolución
+            self.screen_image = self.panel_manager.get_screen_image(self.current_page, (canvas_width, canvas_height))
+            img = self.panel_manager.render_region(self.current_page, None, (canvas_width, canvas_height), resample)
+            width, height = img.size
             self.photo = ImageTk.PhotoImage(img)
             
             self.canvas.delete("all")
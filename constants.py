@@ -6,3 +6,88 @@ Created on Sun Jul  7 17:31:19 2024
 """
 
 WINDOW_GEOMETRY = "1400x1050"
+
+# Memoria máxima (MB) para las páginas decodificadas que guarda PanelManager
+PAGE_CACHE_MB = 512
+
+# Páginas que se decodifican por adelantado y número de hilos para hacerlo
+PREFETCH_DEPTH = 3
+PREFETCH_WORKERS = 2
+
+# Caché de extracción en disco: una subcarpeta por cómic, con tope de tamaño
+EXTRACT_CACHE_DIR = 'extracted_comic'
+EXTRACT_CACHE_MB = 2048
+
+# Extensiones que se consideran páginas dentro de un CBZ/CBR
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.gif', '.bmp')
+
+# Niveles de la pirámide por página (1 = resolución completa, 2 = mitad...)
+PYRAMID_SCALES = (1, 2, 4)
+
+# Milisegundos sin redimensionar antes de la pasada final de calidad
+RESIZE_IDLE_MS = 150
+
+# Memoria máxima (MB) para páginas y paneles ya escalados al tamaño del lienzo
+RENDER_CACHE_MB = 128
+
+# Procesos para recalcular paneles en lote (None = uno por núcleo)
+DETECTION_WORKERS = None
+
+# Registros en el diario .gui.journal antes de compactarlo en el .gui
+GUI_JOURNAL_MAX_RECORDS = 500
+
+# Altura (px) a la que se reduce la página para detectar paneles (None = resolución completa)
+PANEL_ANALYSIS_HEIGHT = 1200
+
+# Perfiles del detector de paneles (se elige uno por cómic):
+#   block_size/c: umbral adaptativo, kernel: cierre morfológico,
+#   min_area_ratio: área mínima de un panel respecto a la página,
+#   analysis_height: altura de análisis (None = resolución completa)
+DETECTOR_PROFILES = {
+    'predeterminado': {'block_size': 11, 'c': 2, 'kernel': 3, 'min_area_ratio': 0.005,
+                       'analysis_height': PANEL_ANALYSIS_HEIGHT},
+    # Tramas densas: bloque mayor y cierre más fuerte para no partir paneles
+    'manga': {'block_size': 15, 'c': 4, 'kernel': 5, 'min_area_ratio': 0.01,
+              'analysis_height': PANEL_ANALYSIS_HEIGHT},
+    # Color plano y márgenes anchos
+    'western': {'block_size': 11, 'c': 2, 'kernel': 3, 'min_area_ratio': 0.008,
+                'analysis_height': PANEL_ANALYSIS_HEIGHT},
+    # Tiras verticales muy altas: los paneles son una fracción pequeña de la página
+    'webtoon': {'block_size': 15, 'c': 3, 'kernel': 5, 'min_area_ratio': 0.0005,
+                'analysis_height': None},
+    # Escaneos pequeños: no se reduce y el bloque es más fino
+    'escaneo_baja_resolucion': {'block_size': 7, 'c': 2, 'kernel': 3, 'min_area_ratio': 0.005,
+                                'analysis_height': None},
+}
+DEFAULT_DETECTOR_PROFILE = 'predeterminado'
+
+# Parámetros comunes a todos los perfiles (un perfil puede sustituirlos):
+#   xycut_confidence: confianza mínima del corte por márgenes (XY-cut) para
+#   aceptar su resultado sin pasar por los contornos (None = sólo contornos)
+DETECTOR_DEFAULTS = {'xycut_confidence': 0.95}
+
+# OCR: hilos trabajadores persistentes e idiomas por defecto de Tesseract
+OCR_WORKERS = 2
+OCR_LANG = 'eng+spa+deu'
+
+# Sin tesserocr: máximo de recortes en cola que se leen con una sola llamada a tesseract
+OCR_BATCH_SIZE = 16
+
+# Caché en disco de paneles detectados (por contenido de la página y parámetros)
+DETECTION_CACHE_DIR = 'detection_cache'
+DETECTION_CACHE_MB = 64
+
+# Caché en disco de resultados de OCR (por píxeles del recorte, idioma, escala y modo)
+OCR_CACHE_DIR = 'ocr_cache'
+OCR_CACHE_MB = 32
+
+# Detección de globos de texto en un panel (balloon_detection):
+#   bright_threshold: gris mínimo del interior de un globo (0-255)
+#   ink_threshold: gris máximo de un píxel de texto
+#   min_area_ratio / max_area_ratio: área del globo respecto al panel
+#   min_fill: fracción mínima de su caja que ocupa el globo (descarta formas alargadas)
+#   min_ink / max_ink: fracción de tinta en el centro de la caja (el texto)
+#   margin: píxeles añadidos alrededor de cada globo para el OCR
+BALLOON_PARAMS = {'bright_threshold': 200, 'ink_threshold': 100, 'min_area_ratio': 0.002,
+                  'max_area_ratio': 0.6, 'min_fill': 0.3, 'min_ink': 0.01, 'max_ink': 0.5,
+                  'margin': 4}
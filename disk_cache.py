@@ -0,0 +1,126 @@
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from logger import logger
+from utils import ensure_directory_exists
+
+DATABASE_NAME = 'cache.sqlite'
+
+
+def content_key(*parts):
+    """
+    Clave estable a partir de bytes y valores serializables en JSON
+    (p. ej. los bytes de una página y los parámetros del algoritmo).
+    """
+    digest = hashlib.sha1()
+    for part in parts:
+        if isinstance(part, (bytes, bytearray, memoryview)):
+            digest.update(part)
+        else:
+            digest.update(json.dumps(part, sort_keys=True).encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+class DiskCache:
+    """
+    Caché persistente de resultados JSON en una base SQLite dentro de
+    `root_dir`, una fila por clave con la fecha de último uso.
+
+    Abrirla no recorre las entradas, y el límite `max_mb` se aplica al espacio
+    que ocupan de verdad las páginas de la base (no a la suma de los JSON,
+    que con un archivo por clave se quedaba muy por debajo de lo que ocupaba
+    en disco). Cuando se supera se borran las entradas usadas hace más tiempo
+    y se devuelve el espacio al sistema. Se puede usar desde varios hilos.
+    """
+
+    def __init__(self, root_dir, max_mb):
+        self.root_dir = root_dir
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        ensure_directory_exists(self.root_dir)
+        self.remove_legacy_entries()
+        self.db = sqlite3.connect(os.path.join(self.root_dir, DATABASE_NAME), timeout=10,
+                                  check_same_thread=False, isolation_level=None)
+        # Debe fijarse antes de crear la tabla para que el archivo pueda encoger
+        self.db.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        self.db.execute('PRAGMA journal_mode = WAL')
+        self.db.execute('CREATE TABLE IF NOT EXISTS entries '
+                        '(key TEXT PRIMARY KEY, value TEXT NOT NULL, last_used REAL NOT NULL)')
+        self.db.execute('CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)')
+
+    def remove_legacy_entries(self):
+        """Borra la caché del formato anterior (un archivo JSON por clave en subcarpetas)."""
+        for name in os.listdir(self.root_dir):
+            path = os.path.join(self.root_dir, name)
+            if len(name) == 2 and os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+                logger.info(f"Removed legacy cache folder {path}")
+
+    def get(self, key):
+        with self.lock:
+            try:
+                row = self.db.execute('SELECT value FROM entries WHERE key = ?', (key,)).fetchone()
+                if row is not None:
+                    self.db.execute('UPDATE entries SET last_used = ? WHERE key = ?', (time.time(), key))
+            except sqlite3.Error as e:
+                logger.warning(f"Could not read cache entry {key} from {self.root_dir}: {e}")
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key, value):
+        data = json.dumps(value)
+        with self.lock:
+            try:
+                self.db.execute('INSERT OR REPLACE INTO entries (key, value, last_used) VALUES (?, ?, ?)',
+                                (key, data, time.time()))
+                if self.used_bytes() > self.max_bytes:
+                    self.enforce_limit()
+            except sqlite3.Error as e:
+                logger.warning(f"Could not write cache entry {key} to {self.root_dir}: {e}")
+
+    def used_bytes(self):
+        """Bytes de las páginas de la base en uso (sin las libres)."""
+        page_size = self.db.execute('PRAGMA page_size').fetchone()[0]
+        page_count = self.db.execute('PRAGMA page_count').fetchone()[0]
+        free_pages = self.db.execute('PRAGMA freelist_count').fetchone()[0]
+        return (page_count - free_pages) * page_size
+
+    def enforce_limit(self):
+        # Se deja margen para no desalojar en cada escritura; se llama con el lock tomado
+        evicted = 0
+        while self.used_bytes() > self.max_bytes * 0.9:
+            deleted = self.db.execute('DELETE FROM entries WHERE key IN '
+                                      '(SELECT key FROM entries ORDER BY last_used LIMIT 64)').rowcount
+            if not deleted:
+                break
+            evicted += deleted
+        # Cada fila devuelta es una página liberada: hay que leerlas todas
+        self.db.execute('PRAGMA incremental_vacuum').fetchall()
+        if evicted:
+            logger.info(f"Evicted {evicted} entries from {self.root_dir}")
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+    def stats(self):
+        with self.lock:
+            size = self.used_bytes()
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'size_mb': size / 1048576,
+        }
@@ -0,0 +1,128 @@
+import hashlib
+import os
+import re
+import shutil
+import threading
+from logger import logger
+from utils import ensure_directory_exists, member_relpath, write_file_atomic
+from constants import EXTRACT_CACHE_DIR, EXTRACT_CACHE_MB
+
+LAST_USED_MARKER = '.last_used'
+
+
+class ExtractionCache:
+    """
+    Directorio de extracción persistente con una subcarpeta por archivo.
+
+    La subcarpeta se identifica por nombre, tamaño y fecha de modificación del
+    archivo, así que reabrir un cómic sin cambios reutiliza lo ya extraído.
+    Cuando el total supera `max_mb` se borran las carpetas usadas hace más tiempo.
+
+    La marca de uso de cada carpeta guarda también su tamaño en bytes, que se
+    actualiza al escribir cada página; así comprobar el límite al abrir un
+    cómic sólo lee una marca por carpeta en lugar de recorrer todas las
+    páginas extraídas. Una carpeta sin tamaño guardado (o con la marca
+    dañada) se mide una vez.
+    """
+
+    def __init__(self, root_dir=EXTRACT_CACHE_DIR, max_mb=EXTRACT_CACHE_MB):
+        self.root_dir = root_dir
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        ensure_directory_exists(self.root_dir)
+        self.lock = threading.Lock()
+        # Tamaño de las carpetas en las que se ha escrito en esta sesión
+        self.sizes = {}
+
+    def archive_key(self, archive_path):
+        st = os.stat(archive_path)
+        name = os.path.basename(archive_path)
+        digest = hashlib.sha1(f"{name}|{st.st_size}|{st.st_mtime_ns}".encode('utf-8')).hexdigest()[:16]
+        stem = re.sub(r'[^\w.-]+', '_', os.path.splitext(name)[0])[:40]
+        return f"{stem}_{digest}"
+
+    def directory_for(self, archive_path):
+        directory = os.path.join(self.root_dir, self.archive_key(archive_path))
+        ensure_directory_exists(directory)
+        self.touch(directory)
+        if self.read_size(directory) is None:
+            self.measure(directory)
+        return directory
+
+    def touch(self, directory):
+        marker = os.path.join(directory, LAST_USED_MARKER)
+        with open(marker, 'a'):
+            pass
+        os.utime(marker, None)
+
+    def read_size(self, directory):
+        try:
+            with open(os.path.join(directory, LAST_USED_MARKER), 'r') as f:
+                return int(f.read())
+        except (OSError, ValueError):
+            return None
+
+    def save_size(self, directory, size):
+        # Sin fsync: si se pierde, la carpeta se vuelve a medir
+        with open(os.path.join(directory, LAST_USED_MARKER), 'w') as f:
+            f.write(str(size))
+
+    def measure(self, directory):
+        """Recorre la carpeta, guarda su tamaño en la marca y lo devuelve."""
+        size = 0
+        for dirpath, _, filenames in os.walk(directory):
+            for filename in filenames:
+                try:
+                    size += os.path.getsize(os.path.join(dirpath, filename))
+                except OSError:
+                    pass
+        with self.lock:
+            self.sizes[directory] = size
+            self.save_size(directory, size)
+        return size
+
+    def folder_size(self, directory):
+        with self.lock:
+            size = self.sizes.get(directory)
+        if size is None:
+            size = self.read_size(directory)
+        return size if size is not None else self.measure(directory)
+
+    def write_member(self, directory, member, data):
+        """Escribe un miembro de forma atómica para no dejar páginas truncadas."""
+        path = os.path.join(directory, member_relpath(member))
+        try:
+            previous = os.path.getsize(path)
+        except OSError:
+            previous = 0
+        write_file_atomic(path, data)
+        with self.lock:
+            size = self.sizes.get(directory)
+            if size is None:
+                size = self.read_size(directory) or 0
+            self.sizes[directory] = size + len(data) - previous
+            self.save_size(directory, self.sizes[directory])
+        return path
+
+    def enforce_limit(self, keep=None):
+        entries = []
+        total = 0
+        for name in os.listdir(self.root_dir):
+            directory = os.path.join(self.root_dir, name)
+            if not os.path.isdir(directory):
+                continue
+            size = self.folder_size(directory)
+            marker = os.path.join(directory, LAST_USED_MARKER)
+            last_used = os.path.getmtime(marker) if os.path.exists(marker) else 0
+            entries.append((last_used, directory, size))
+            total += size
+
+        for last_used, directory, size in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if keep and os.path.abspath(directory) == os.path.abspath(keep):
+                continue
+            shutil.rmtree(directory, ignore_errors=True)
+            with self.lock:
+                self.sizes.pop(directory, None)
+            total -= size
+            logger.info(f"Evicted extraction cache {directory} ({size / 1048576:.1f} MB)")
@@ -1,6 +1,8 @@
+import multiprocessing
 import tkinter as tk
 from tkinter import messagebox  # Asegúrate de importar messagebox
 from comic_viewer import ComicViewer
+from ocr_engine import shutdown_ocr_engine
 import logging
 import platform
 import sys
@@ -49,7 +51,9 @@ def save_scripts_to_zip():
     logger.info(f"Scripts saved to {zip_filename}")
     return zip_filename
 
-def on_closing(root, zip_filename):
+def on_closing(root, viewer, zip_filename):
+    viewer.close()
+    shutdown_ocr_engine()
     if messagebox.askyesno("Salir", "¿Deseas conservar el respaldo?"):
         root.destroy()
     else:
@@ -57,11 +61,13 @@ def on_closing(root, zip_filename):
         root.destroy()
 
 if __name__ == "__main__":
+    # Necesario para los ProcessPoolExecutor en el ejecutable de PyInstaller
+    multiprocessing.freeze_support()
     zip_filename = save_scripts_to_zip()
 
     root = tk.Tk()
     viewer = ComicViewer(root)
     root.geometry("1400x1000")
     logger.info("ComicViewer application started")
-    root.protocol("WM_DELETE_WINDOW", lambda: on_closing(root, zip_filename))
+    root.protocol("WM_DELETE_WINDOW", lambda: on_closing(root, viewer, zip_filename))
     root.mainloop()
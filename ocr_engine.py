@@ -0,0 +1,362 @@
+import os
+import queue
+import subprocess
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import Future
+import cv2
+import numpy as np
+from PIL import Image
+from disk_cache import DiskCache, content_key
+from logger import logger
+from constants import OCR_WORKERS, OCR_LANG, OCR_CACHE_DIR, OCR_CACHE_MB, OCR_BATCH_SIZE
+
+try:
+    import tesserocr
+except ImportError:
+    tesserocr = None
+
+# Columnas de la salida TSV de Tesseract (las mismas que image_to_data)
+TSV_INT_COLUMNS = ('level', 'page_num', 'block_num', 'par_num', 'line_num', 'word_num',
+                   'left', 'top', 'width', 'height')
+
+
+def parse_tsv(tsv):
+    """Convierte la salida TSV de Tesseract en el dict de columnas de pytesseract.Output.DICT."""
+    lines = tsv.splitlines()
+    if lines and lines[0].startswith('level'):
+        lines = lines[1:]
+    data = {column: [] for column in TSV_INT_COLUMNS + ('conf', 'text')}
+    for line in lines:
+        fields = line.split('\t')
+        if len(fields) < 11:
+            continue
+        for column, value in zip(TSV_INT_COLUMNS, fields):
+            data[column].append(int(value))
+        data['conf'].append(float(fields[10]))
+        data['text'].append(fields[11] if len(fields) > 11 else '')
+    return data
+
+
+def split_tsv_pages(data, pages):
+    """
+    Separa el dict de parse_tsv de una llamada con varias imágenes en uno por
+    imagen, cada uno numerado como página 1 igual que image_to_data.
+    """
+    if set(data['page_num']) != set(range(1, pages + 1)):
+        raise ValueError(f"tesseract returned pages {sorted(set(data['page_num']))} for {pages} images")
+    split = [{column: [] for column in data} for _ in range(pages)]
+    for i, page in enumerate(data['page_num']):
+        for column, values in data.items():
+            split[page - 1][column].append(1 if column == 'page_num' else values[i])
+    return split
+
+
+def _union(boxes):
+    return (min(b[0] for b in boxes), min(b[1] for b in boxes), max(b[2] for b in boxes), max(b[3] for b in boxes))
+
+
+def build_ocr_result(data):
+    """
+    Agrupa la salida de image_to_data (una sola pasada de Tesseract) en:
+
+        text    texto completo: palabras separadas por espacios, líneas por
+                saltos de línea y bloques por una línea en blanco
+        words   [{'text', 'conf', 'box', 'block', 'par', 'line'}]
+        lines   [{'text', 'conf' (media), 'box', 'block', 'par', 'line'}]
+        blocks  [{'text', 'box', 'block'}]
+
+    Las cajas son (x1, y1, x2, y2) en píxeles de la imagen.
+    """
+    words = []
+    for i, text in enumerate(data['text']):
+        text = str(text).strip()
+        # Nivel 5 = palabra; los demás niveles sólo describen la estructura
+        if data['level'][i] != 5 or not text:
+            continue
+        left, top = data['left'][i], data['top'][i]
+        words.append({
+            'text': text,
+            'conf': float(data['conf'][i]),
+            'box': (left, top, left + data['width'][i], top + data['height'][i]),
+            'block': data['block_num'][i],
+            'par': data['par_num'][i],
+            'line': data['line_num'][i],
+        })
+
+    lines = []
+    for word in words:
+        key = (word['block'], word['par'], word['line'])
+        if not lines or lines[-1]['key'] != key:
+            lines.append({'key': key, 'words': []})
+        lines[-1]['words'].append(word)
+    lines = [{
+        'text': ' '.join(w['text'] for w in line['words']),
+        'conf': sum(w['conf'] for w in line['words']) / len(line['words']),
+        'box': _union([w['box'] for w in line['words']]),
+        'block': line['key'][0],
+        'par': line['key'][1],
+        'line': line['key'][2],
+    } for line in lines]
+
+    blocks = []
+    for line in lines:
+        if not blocks or blocks[-1]['block'] != line['block']:
+            blocks.append({'block': line['block'], 'lines': []})
+        blocks[-1]['lines'].append(line)
+    blocks = [{
+        'text': '\n'.join(l['text'] for l in block['lines']),
+        'box': _union([l['box'] for l in block['lines']]),
+        'block': block['block'],
+    } for block in blocks]
+
+    return {
+        'text': '\n\n'.join(b['text'] for b in blocks),
+        'words': words,
+        'lines': lines,
+        'blocks': blocks,
+    }
+
+
+def scale_image(image, scale):
+    """Amplía una imagen PIL con interpolación cúbica, como hacía el editor antes de reintentar el OCR."""
+    size = (max(1, int(image.width * scale)), max(1, int(image.height * scale)))
+    return Image.fromarray(cv2.resize(np.array(image), size, interpolation=cv2.INTER_CUBIC))
+
+
+class OcrEngine:
+    """
+    Motor de OCR con hilos trabajadores de larga duración.
+
+    Con tesserocr cada hilo mantiene abierta una instancia de la API de
+    Tesseract por idioma y modo de segmentación, así que los modelos se cargan
+    una sola vez y no hay procesos ni PNG temporales por llamada. Sin tesserocr
+    cada trabajador junta las peticiones ya encoladas con el mismo idioma y
+    modo (hasta OCR_BATCH_SIZE) y las lee con un solo proceso tesseract, que
+    recibe un archivo con la lista de imágenes: los modelos se cargan una vez
+    por lote en lugar de una vez por recorte.
+
+    Las peticiones entran en una cola y se devuelven como Future. Los
+    resultados se guardan en una caché en disco indexada por los píxeles del
+    recorte, el idioma, la escala y el modo de segmentación: repetir una
+    selección o un reintento ya hecho se resuelve sin llamar a Tesseract.
+    """
+
+    def __init__(self, workers=OCR_WORKERS, lang=OCR_LANG, cache_dir=OCR_CACHE_DIR, cache_mb=OCR_CACHE_MB):
+        self.lang = lang
+        self.backend = 'tesserocr' if tesserocr is not None else 'pytesseract'
+        self.cache = DiskCache(cache_dir, cache_mb)
+        self.cache_lock = threading.Lock()
+        self.requests = queue.Queue()
+        self.threads = [threading.Thread(target=self._worker, name=f"ocr-{i}", daemon=True)
+                        for i in range(max(1, workers))]
+        for thread in self.threads:
+            thread.start()
+        logger.info(f"OCR engine started with {len(self.threads)} workers ({self.backend}, lang={lang})")
+        if tesserocr is None:
+            logger.info(f"tesserocr is not installed: queued OCR requests run in batches of up to "
+                        f"{OCR_BATCH_SIZE} images per tesseract process")
+
+    def cache_key(self, image, lang, scale, psm, kind):
+        return content_key(image.tobytes(), 'ocr', self.backend, image.mode, image.size, lang, scale, psm, kind)
+
+    def submit(self, image, lang=None, psm=None, output='string', scale=1.0):
+        """
+        Encola el OCR de una imagen PIL. `output` es 'string' (texto), 'data'
+        (dict de columnas como pytesseract.image_to_data) o 'result' (texto,
+        palabras, líneas y bloques de build_ocr_result, en una sola pasada).
+        Con `scale` distinto de 1 la imagen se amplía (INTER_CUBIC) antes del
+        OCR; las cajas devueltas están en píxeles de la imagen ampliada.
+        Devuelve un Future, ya resuelto si el resultado estaba en la caché.
+        """
+        lang = lang or self.lang
+        # 'data' y 'result' salen de la misma pasada de Tesseract y comparten entrada
+        kind = 'data' if output == 'result' else output
+        key = self.cache_key(image, lang, scale, psm, kind)
+        with self.cache_lock:
+            cached = self.cache.get(key)
+        future = Future()
+        if cached is not None:
+            future.set_result(build_ocr_result(cached) if output == 'result' else cached)
+            return future
+        self.requests.put((future, image, lang, psm, output, scale, key))
+        return future
+
+    def image_to_string(self, image, lang=None, psm=None, scale=1.0):
+        return self.submit(image, lang, psm, 'string', scale).result()
+
+    def image_to_data(self, image, lang=None, psm=None, scale=1.0):
+        return self.submit(image, lang, psm, 'data', scale).result()
+
+    def recognize(self, image, lang=None, psm=None, scale=1.0):
+        """Texto, cajas, confianzas y agrupación por líneas y bloques con una única llamada a Tesseract."""
+        return self.submit(image, lang, psm, 'result', scale).result()
+
+    def shutdown(self):
+        for _ in self.threads:
+            self.requests.put(None)
+        stats = self.cache.stats()
+        logger.info(f"OCR cache: {stats['hits']} hits, {stats['misses']} misses "
+                    f"({stats['hit_rate']:.0%}), {stats['size_mb']:.1f} MB")
+
+    def _worker(self):
+        apis = {}
+        # Peticiones sacadas de la cola al formar un lote en el que no encajaban
+        pending = deque()
+        while True:
+            item = pending.popleft() if pending else self.requests.get()
+            if item is None:
+                break
+            batch = [item]
+            if tesserocr is None:
+                self._fill_batch(batch, pending)
+            batch = [entry for entry in batch if entry[0].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            _, _, lang, psm, output, _, _ = batch[0]
+            kind = 'data' if output == 'result' else output
+            try:
+                images = [scale_image(image, scale) if scale != 1 else image
+                          for _, image, _, _, _, scale, _ in batch]
+                if tesserocr is not None:
+                    results = [self._run_tesserocr(apis, images[0], lang, psm, kind)]
+                else:
+                    results = self._run_pytesseract_batch(images, lang, psm, kind)
+            except Exception as e:
+                results = [e] * len(batch)
+            for (future, _, _, _, output, _, key), result in zip(batch, results):
+                try:
+                    if isinstance(result, Exception):
+                        raise result
+                    with self.cache_lock:
+                        self.cache.put(key, result)
+                    if output == 'result':
+                        result = build_ocr_result(result)
+                except Exception as e:
+                    logger.error(f"OCR request failed: {e}")
+                    future.set_exception(e)
+                else:
+                    future.set_result(result)
+        for api in apis.values():
+            api.End()
+
+    def _fill_batch(self, batch, pending):
+        """Añade a `batch` las peticiones ya encoladas con el mismo idioma, modo y tipo de salida."""
+        def batch_key(item):
+            _, _, lang, psm, output, _, _ = item
+            return lang, psm, 'data' if output == 'result' else output
+
+        wanted = batch_key(batch[0])
+        for item in list(pending):
+            if len(batch) == OCR_BATCH_SIZE or item is None:
+                break
+            if batch_key(item) == wanted:
+                pending.remove(item)
+                batch.append(item)
+        while len(batch) < OCR_BATCH_SIZE and None not in pending:
+            try:
+                item = self.requests.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None and batch_key(item) == wanted:
+                batch.append(item)
+                continue
+            pending.append(item)
+            if item is None:
+                break
+
+    def _run_tesserocr(self, apis, image, lang, psm, output):
+        key = (lang, psm)
+        api = apis.get(key)
+        if api is None:
+            # Carga de modelos: sólo la primera vez por hilo, idioma y modo
+            if psm is None:
+                api = tesserocr.PyTessBaseAPI(lang=lang)
+            else:
+                api = tesserocr.PyTessBaseAPI(lang=lang, psm=psm)
+            apis[key] = api
+        api.SetImage(image)
+        if output == 'data':
+            return parse_tsv(api.GetTSVText(0))
+        return api.GetUTF8Text()
+
+    def _run_pytesseract(self, image, lang, psm, output):
+        import pytesseract
+        config = f'--psm {psm}' if psm is not None else ''
+        if output == 'data':
+            return pytesseract.image_to_data(image, lang=lang, config=config, output_type=pytesseract.Output.DICT)
+        return pytesseract.image_to_string(image, lang=lang, config=config)
+
+    def _run_pytesseract_batch(self, images, lang, psm, output):
+        """
+        Un resultado por imagen, o la excepción de esa imagen. Si la llamada
+        conjunta falla se repite imagen por imagen, para que un recorte malo
+        no haga fallar a los demás.
+        """
+        if len(images) > 1:
+            try:
+                return self._run_tesseract_list(images, lang, psm, output)
+            except Exception as e:
+                logger.warning(f"Batched tesseract call failed, reading {len(images)} images one by one: {e}")
+        results = []
+        for image in images:
+            try:
+                results.append(self._run_pytesseract(image, lang, psm, output))
+            except Exception as e:
+                results.append(e)
+        return results
+
+    def _run_tesseract_list(self, images, lang, psm, output):
+        """
+        Lee todas las imágenes con un solo proceso tesseract, pasándole un
+        archivo con la ruta de cada una. En TSV la columna page_num indica la
+        imagen; en texto las imágenes se separan con un salto de página.
+        """
+        import pytesseract
+        with tempfile.TemporaryDirectory(prefix='ocr_batch_') as tmp_dir:
+            paths = []
+            for i, image in enumerate(images):
+                path = os.path.join(tmp_dir, f'{i}.png')
+                image.save(path)
+                paths.append(path)
+            list_path = os.path.join(tmp_dir, 'images.txt')
+            with open(list_path, 'w', encoding='utf-8') as f:
+                f.write('\n'.join(paths) + '\n')
+            command = [pytesseract.pytesseract.tesseract_cmd, list_path, 'stdout', '-l', lang]
+            if psm is not None:
+                command += ['--psm', str(psm)]
+            if output == 'data':
+                command.append('tsv')
+            # Sin ventana de consola en Windows, como pytesseract
+            completed = subprocess.run(command, capture_output=True, check=True,
+                                       creationflags=getattr(subprocess, 'CREATE_NO_WINDOW', 0))
+        text = completed.stdout.decode('utf-8', errors='replace')
+        if output == 'data':
+            return split_tsv_pages(parse_tsv(text), len(images))
+        # Cada página termina con '\f', como en image_to_string
+        pages = text.split('\f')
+        if len(pages) <= len(images):
+            raise ValueError(f"tesseract returned {len(pages) - 1} pages for {len(images)} images")
+        return [page + '\f' for page in pages[:len(images)]]
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_ocr_engine():
+    """Motor compartido por toda la aplicación; se crea en el primer uso."""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = OcrEngine()
+        return _engine
+
+
+def shutdown_ocr_engine():
+    global _engine
+    with _engine_lock:
+        if _engine is not None:
+            _engine.shutdown()
+            _engine = None
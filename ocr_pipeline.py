@@ -0,0 +1,258 @@
+import json
+import os
+import threading
+import time
+from tkinter import Toplevel, Label, Button, ttk
+from ocr_engine import get_ocr_engine
+from logger import logger
+from constants import OCR_LANG, OCR_WORKERS
+
+
+def ocr_store_path(comic_path):
+    return comic_path + '.ocr'
+
+
+def text_in_box(record, box):
+    """
+    Texto de las palabras de un resultado de OCR cuyo centro cae dentro de
+    `box` (x1, y1, x2, y2), una línea de Tesseract por renglón.
+    """
+    x1, y1, x2, y2 = box
+    lines = []
+    for word in record.get('words', []):
+        wx1, wy1, wx2, wy2 = word['box']
+        cx, cy = (wx1 + wx2) / 2, (wy1 + wy2) / 2
+        if not (x1 <= cx <= x2 and y1 <= cy <= y2):
+            continue
+        key = (word['block'], word['par'], word['line'])
+        if not lines or lines[-1][0] != key:
+            lines.append((key, []))
+        lines[-1][1].append(word['text'])
+    return '\n'.join(' '.join(words) for _, words in lines)
+
+
+class OcrStore:
+    """
+    Resultados de OCR de un cómic, un registro JSON por panel en `<cómic>.ocr`.
+
+    El archivo sólo crece: cada panel terminado se añade en una línea y se
+    vuelca a disco, así que una interrupción pierde como mucho el panel en
+    curso. Al cargar, el último registro de un mismo panel prevalece y una
+    línea final incompleta se descarta (y se trunca para poder seguir
+    añadiendo). Cada registro guarda la caja del panel, de modo que un panel
+    que se ha movido o redimensionado desde el OCR no devuelve texto viejo.
+    """
+
+    def __init__(self, comic_path):
+        self.path = ocr_store_path(comic_path)
+        self.lock = threading.Lock()
+        self.records = {}
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        valid_bytes = 0
+        with open(self.path, 'rb') as f:
+            for raw in f:
+                try:
+                    record = json.loads(raw.decode('utf-8'))
+                except ValueError:
+                    break
+                if not raw.endswith(b'\n'):
+                    break
+                self.records[(record['page'], record['panel'])] = record
+                valid_bytes += len(raw)
+        if valid_bytes < os.path.getsize(self.path):
+            logger.warning(f"Discarding incomplete tail of OCR store {self.path}")
+            with open(self.path, 'r+b') as f:
+                f.truncate(valid_bytes)
+        logger.info(f"Loaded {len(self.records)} OCR records from {self.path}")
+
+    def get(self, page, panel, bbox=None):
+        record = self.records.get((page, panel))
+        if record is None or (bbox is not None and tuple(record['bbox']) != tuple(bbox)):
+            return None
+        return record
+
+    def has(self, page, panel, bbox):
+        return self.get(page, panel, bbox) is not None
+
+    def append(self, page, panel, bbox, lang, result):
+        record = {'page': page, 'panel': panel, 'bbox': list(bbox), 'lang': lang}
+        record.update(result)
+        line = json.dumps(record, ensure_ascii=False) + '\n'
+        with self.lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+            self.records[(page, panel)] = json.loads(line)
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_ocr_store(comic_path):
+    """Almacén compartido por el OCR por lotes y el editor de traducción."""
+    key = os.path.abspath(comic_path)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = _stores[key] = OcrStore(comic_path)
+        return store
+
+
+class ComicOcrPipeline:
+    """
+    OCR de todos los paneles del cómic en segundo plano.
+
+    Un hilo recorre las páginas con paneles (PanelManager.get_panels),
+    decodifica cada página a resolución completa, recorta sus paneles y los
+    envía al OcrEngine compartido. Cada resultado se guarda en el OcrStore en
+    cuanto termina, de modo que al volver a lanzar el proceso tras cancelarlo
+    o cerrar la aplicación se continúa por el primer panel sin resultado.
+    Sólo hay unos pocos paneles en vuelo a la vez para acotar la memoria.
+
+    Una ventana muestra el progreso y el tiempo restante y permite cancelar.
+    """
+
+    def __init__(self, root, panel_manager, on_finished=None, lang=OCR_LANG, poll_ms=200):
+        self.root = root
+        self.panel_manager = panel_manager
+        self.store = get_ocr_store(panel_manager.input_file)
+        self.on_finished = on_finished
+        self.lang = lang
+        self.poll_ms = poll_ms
+        self.engine = get_ocr_engine()
+        # Instantánea de los paneles: las ediciones posteriores invalidan el
+        # resultado por la caja guardada, no a mitad del recorrido
+        self.jobs = {}
+        for page in range(panel_manager.get_num_pages()):
+            pending = [(index, tuple(bbox)) for index, bbox in enumerate(panel_manager.get_panels(page))
+                       if not self.store.has(page, index, bbox)]
+            if pending:
+                self.jobs[page] = pending
+        self.total = sum(len(panels) for panels in self.jobs.values())
+        self.completed = 0
+        self.errors = 0
+        self.counter_lock = threading.Lock()
+        self.in_flight = threading.Semaphore(max(1, OCR_WORKERS) * 4)
+        self.futures = set()
+        self.cancelled = threading.Event()
+        self.thread = None
+        self.poll_id = None
+        self.start_time = None
+        self.finished = False
+
+    def start(self):
+        if not self.total:
+            self.finish()
+            return
+        self.create_progress_window()
+        self.start_time = time.perf_counter()
+        self.thread = threading.Thread(target=self.feed, name="ocr-pipeline", daemon=True)
+        self.thread.start()
+        logger.info(f"Comic OCR started: {self.total} panels on {len(self.jobs)} pages "
+                    f"({len(self.store.records)} already in {self.store.path})")
+        self.poll_id = self.root.after(self.poll_ms, self.poll)
+
+    def feed(self):
+        if self.panel_manager.input_file.lower().endswith(('.cbr', '.rar')):
+            # Se van a leer todas las páginas: una sola llamada a unrar para
+            # todo el cómic en lugar de una por página
+            self.panel_manager.extract_all_files()
+        for page, panels in self.jobs.items():
+            if self.cancelled.is_set():
+                return
+            try:
+                _, image = self.panel_manager.decode_page(page)
+            except Exception as e:
+                logger.error(f"Error decoding page {page + 1} for OCR: {e}")
+                with self.counter_lock:
+                    self.errors += len(panels)
+                continue
+            for index, bbox in panels:
+                self.in_flight.acquire()
+                if self.cancelled.is_set():
+                    self.in_flight.release()
+                    return
+                future = self.engine.submit(image.crop(bbox), lang=self.lang, output='result')
+                with self.counter_lock:
+                    self.futures.add(future)
+                future.add_done_callback(lambda f, page=page, index=index, bbox=bbox: self.panel_done(f, page, index, bbox))
+
+    def panel_done(self, future, page, index, bbox):
+        # Se ejecuta en el hilo del OCR que terminó el panel
+        self.in_flight.release()
+        with self.counter_lock:
+            self.futures.discard(future)
+        if future.cancelled():
+            return
+        try:
+            self.store.append(page, index, bbox, self.lang, future.result())
+        except Exception as e:
+            logger.error(f"OCR failed for page {page + 1}, panel {index + 1}: {e}")
+            with self.counter_lock:
+                self.errors += 1
+            return
+        with self.counter_lock:
+            self.completed += 1
+
+    def create_progress_window(self):
+        self.window = Toplevel(self.root)
+        self.window.title("OCR del cómic")
+        self.window.resizable(False, False)
+        self.progress = ttk.Progressbar(self.window, length=360, mode='determinate', maximum=self.total)
+        self.progress.pack(padx=10, pady=10)
+        self.status_label = Label(self.window, text=f"Preparando {self.total} paneles...", anchor='w')
+        self.status_label.pack(fill='x', padx=10)
+        Button(self.window, text="Cancelar", command=self.cancel).pack(pady=10)
+        self.window.protocol("WM_DELETE_WINDOW", self.cancel)
+
+    def poll(self):
+        self.poll_id = None
+        with self.counter_lock:
+            completed, errors, busy = self.completed, self.errors, bool(self.futures)
+        done = completed + errors
+        self.progress['value'] = done
+        elapsed = time.perf_counter() - self.start_time
+        text = f"Panel {done} de {self.total}"
+        if completed:
+            remaining = elapsed / done * (self.total - done)
+            text += f" | {done / elapsed:.1f} paneles/s | quedan ~{int(remaining) // 60}:{int(remaining) % 60:02d}"
+        self.status_label.config(text=text)
+        if done < self.total and (busy or self.thread.is_alive()):
+            self.poll_id = self.root.after(self.poll_ms, self.poll)
+        else:
+            self.finish()
+
+    def cancel(self):
+        if self.cancelled.is_set() or self.finished:
+            return
+        self.cancelled.set()
+        logger.info("Comic OCR cancelled")
+        with self.counter_lock:
+            futures = list(self.futures)
+        # Los paneles que ya está leyendo Tesseract terminan y se guardan
+        for future in futures:
+            future.cancel()
+        if self.poll_id is not None:
+            self.root.after_cancel(self.poll_id)
+            self.poll_id = None
+        self.finish()
+
+    def finish(self):
+        if self.finished:
+            return
+        self.finished = True
+        if getattr(self, 'window', None) is not None and self.window.winfo_exists():
+            self.window.destroy()
+        if self.start_time is not None:
+            elapsed = time.perf_counter() - self.start_time
+            logger.info(f"Comic OCR: {self.completed} of {self.total} panels in {elapsed:.1f}s, "
+                        f"{self.errors} errors, cancelled={self.cancelled.is_set()}")
+        if self.on_finished:
+            self.on_finished(self)
+            self.on_finished = None
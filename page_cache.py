@@ -0,0 +1,62 @@
+import threading
+from collections import OrderedDict
+from logger import logger
+
+
+def image_nbytes(image):
+    """Memoria aproximada que ocupa una imagen PIL ya decodificada."""
+    return image.width * image.height * len(image.getbands())
+
+
+class PageCache:
+    """
+    Caché LRU de imágenes decodificadas con un presupuesto de memoria en MB.
+
+    Las imágenes guardadas se comparten entre el visor y los editores, por lo
+    que nunca deben modificarse en sitio (usar crop/resize/copy).
+    """
+
+    def __init__(self, max_mb):
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, image, nbytes=None):
+        if nbytes is None:
+            nbytes = image_nbytes(image)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old[1]
+            self._entries[key] = (image, nbytes)
+            self.current_bytes += nbytes
+            self._evict()
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def _evict(self):
+        # Se conserva siempre la entrada más reciente aunque supere el presupuesto
+        while self.current_bytes > self.max_bytes and len(self._entries) > 1:
+            key, (_, nbytes) = self._entries.popitem(last=False)
+            self.current_bytes -= nbytes
+            logger.debug(f"Page cache evicted {key} ({nbytes / 1048576:.1f} MB)")
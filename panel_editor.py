@@ -103,8 +103,7 @@ class PanelEditor:
         self.reorder_button.pack(side=tk.LEFT, padx=5, pady=5)
 
     def load_image(self):
-        image_path = self.panel_manager.get_page_path(self.current_page)
-        self.original_image = Image.open(image_path)
+        self.original_image = self.panel_manager.get_page_image(self.current_page)
         self.panels = self.panel_manager.get_panels(self.current_page)
         self.multiple_selection = []
         self.fit_image_to_canvas()
@@ -134,8 +133,9 @@ class PanelEditor:
 
             self.scale_factor = width / self.original_image.width
 
-            self.image = self.original_image.copy()
-            self.image = self.image.resize((width, height), Image.LANCZOS)
+            # Se remuestrea desde el nivel más pequeño de la pirámide que cubre el lienzo
+            source = self.panel_manager.get_screen_image(self.current_page, (canvas_width, canvas_height))
+            self.image = source.resize((width, height), Image.LANCZOS)
             self.photo = ImageTk.PhotoImage(self.image)
 
             self.canvas.delete("all")
@@ -183,8 +183,14 @@ class PanelEditor:
         offset_x = (canvas_width - image_width) / 2
         offset_y = (canvas_height - image_height) / 2
         
-        self.start_x = (event.x - offset_x) / self.scale_factor
-        self.start_y = (event.y - offset_y) / self.scale_factor
+        # Los paneles no pueden salirse de la página
+        self.start_x, self.start_y = self.clamp_to_page((event.x - offset_x) / self.scale_factor,
+                                                        (event.y - offset_y) / self.scale_factor)
+
+    def clamp_to_page(self, x, y):
+        """Ajusta un punto en coordenadas de la página a sus límites."""
+        width, height = self.original_image.size
+        return min(max(x, 0), width), min(max(y, 0), height)
 
     def on_drag(self, event):
         canvas_width = self.canvas.winfo_width()
@@ -215,8 +221,8 @@ class PanelEditor:
         offset_x = (canvas_width - image_width) / 2
         offset_y = (canvas_height - image_height) / 2
         
-        self.end_x = (event.x - offset_x) / self.scale_factor
-        self.end_y = (event.y - offset_y) / self.scale_factor
+        self.end_x, self.end_y = self.clamp_to_page((event.x - offset_x) / self.scale_factor,
+                                                    (event.y - offset_y) / self.scale_factor)
 
         x1, y1 = min(self.start_x, self.end_x), min(self.start_y, self.end_y)
         x2, y2 = max(self.start_x, self.end_x), max(self.start_y, self.end_y)
@@ -343,12 +349,13 @@ class PanelEditor:
     @log_function
     def _reorder_remaining_pages(self, start_page):
         num_pages = self.panel_manager.get_num_pages()
-        for page in range(start_page, num_pages):
-            panels = self.panel_manager.get_panels(page)
-            if panels:
-                panels.sort(key=lambda p: (p[1], p[0]))  # Ordenar por coordenadas (y, x)
-                self.panel_manager.set_panels(page, panels)
-                logger.info(f"Reordenados paneles en página {page + 1}")
+        with self.panel_manager.batch():
+            for page in range(start_page, num_pages):
+                panels = self.panel_manager.get_panels(page)
+                if panels:
+                    panels.sort(key=lambda p: (p[1], p[0]))  # Ordenar por coordenadas (y, x)
+                    self.panel_manager.set_panels(page, panels)
+                    logger.info(f"Reordenados paneles en página {page + 1}")
         self.load_image()
         messagebox.showinfo("Reordenar", "Se han reordenado todas las hojas remanentes automáticamente.")
 
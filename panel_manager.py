@@ -1,10 +1,125 @@
+import io
+import json
 import os
+import threading
 import zipfile
+from contextlib import contextmanager
 import rarfile
-from utils import parse_gui_file, save_gui_file, ensure_directory_exists
+from utils import (parse_gui_file, save_gui_file, append_gui_journal, gui_journal_path, gui_is_legacy,
+                   member_relpath, remap_translation_pages,
+                   natural_sort_key, archive_signature, load_page_index, save_page_index, write_file_atomic)
 from PIL import Image
 from logger import logger
+from page_cache import PageCache
+from extraction_cache import ExtractionCache
+from disk_cache import DiskCache, content_key
+from panel_recalculation import detector_params
+from parallel_extract import extract_members
+from constants import (PAGE_CACHE_MB, RENDER_CACHE_MB, IMAGE_EXTENSIONS, PYRAMID_SCALES, GUI_JOURNAL_MAX_RECORDS,
+                       DETECTION_CACHE_DIR, DETECTION_CACHE_MB, DETECTOR_PROFILES, DEFAULT_DETECTOR_PROFILE)
 import subprocess
+
+
+def fit_size(size, box):
+    """Tamaño con el que una imagen de `size` cabe en `box` manteniendo la proporción."""
+    img_ratio = size[0] / size[1]
+    box_ratio = box[0] / box[1]
+    if img_ratio > box_ratio:
+        width = box[0]
+        height = int(width / img_ratio)
+    else:
+        height = box[1]
+        width = int(height * img_ratio)
+    return max(1, width), max(1, height)
+
+
+def draft_scale(size, target_size):
+    """Mayor reducción JPEG (8, 4, 2 o 1) que sigue siendo >= target_size."""
+    ratio = min(size[0] // max(1, target_size[0]), size[1] // max(1, target_size[1]))
+    for scale in (8, 4, 2):
+        if ratio >= scale:
+            return scale
+    return 1
+
+
+def clamp_box(bbox, size):
+    """
+    Ajusta la caja (x1, y1, x2, y2) a los límites de una imagen de `size`.
+    Devuelve None si no queda área (panel fuera de la página).
+    """
+    x1, y1, x2, y2 = bbox
+    x1, y1 = max(0, x1), max(0, y1)
+    x2, y2 = min(size[0], x2), min(size[1], y2)
+    if x2 <= x1 or y2 <= y1:
+        return None
+    return x1, y1, x2, y2
+
+
+def open_archive(file_path):
+    logger.info(f"Attempting to open archive: {file_path}")
+    if file_path.lower().endswith(('.cbr', '.rar')):
+        logger.debug("Opening RAR archive")
+        return rarfile.RarFile(file_path)
+    elif file_path.lower().endswith(('.cbz', '.zip')):
+        logger.debug("Opening ZIP archive")
+        return zipfile.ZipFile(file_path)
+    else:
+        logger.error(f"Unsupported file format: {file_path}")
+        raise ValueError("Formato de archivo no soportado")
+
+
+def build_page_index(archive):
+    """
+    Recorre el archivo una vez y devuelve las páginas en orden natural con
+    nombre, tamaño comprimido, tamaño real y CRC de cada una.
+    """
+    entries = []
+    for info in archive.infolist():
+        if info.is_dir() or not info.filename.lower().endswith(IMAGE_EXTENSIONS):
+            continue
+        entries.append({
+            'name': info.filename,
+            'compress_size': info.compress_size,
+            'file_size': info.file_size,
+            'crc': info.CRC
+        })
+    entries.sort(key=lambda e: natural_sort_key(e['name']))
+    logger.debug(f"Found {len(entries)} image files in archive")
+    return entries
+
+
+def read_page_index(input_file, archive):
+    """
+    Devuelve (páginas, guardado): el índice de `<cómic>.idx` si corresponde al
+    archivo actual o, si no, uno construido en memoria. `guardado` es el
+    contenido leído del .idx (None si no había), que indica si el .gui ya se
+    había pasado a orden natural. No escribe nada.
+    """
+    saved = load_page_index(input_file + ".idx")
+    if saved and saved.get('signature') == archive_signature(input_file):
+        return saved['pages'], saved
+    return build_page_index(archive), saved
+
+
+def legacy_page_map(pages):
+    """
+    Los .gui sin cabecera de formato numeran las páginas en orden
+    lexicográfico y sólo con JPG/PNG. Devuelve {página antigua: página nueva}
+    o None si los dos órdenes coinciden.
+    """
+    natural = [e['name'] for e in pages]
+    lexical = sorted(n for n in natural if n.lower().endswith(('.jpg', '.jpeg', '.png')))
+    if lexical == natural:
+        return None
+    new_index = {name: i for i, name in enumerate(natural)}
+    return {old: new_index[name] for old, name in enumerate(lexical)}
+
+
+def remap_pages(corrections, page_map):
+    """Renumera las claves de página de `corrections` con `page_map`; descarta las que no existen."""
+    return {page_map[page]: panels for page, panels in corrections.items() if page in page_map}
+
+
 class PanelManager:
     # def __init__(self, input_file):
     #     self.input_file = input_file
@@ -15,21 +130,76 @@ class PanelManager:
     #     logger.info(f"PanelManager initialized for {input_file}")
 
     def open_archive(self, file_path):
-        logger.info(f"Attempting to open archive: {file_path}")
-        if file_path.lower().endswith(('.cbr', '.rar')):
-            logger.debug("Opening RAR archive")
-            return rarfile.RarFile(file_path)
-        elif file_path.lower().endswith(('.cbz', '.zip')):
-            logger.debug("Opening ZIP archive")
-            return zipfile.ZipFile(file_path)
-        else:
-            logger.error(f"Unsupported file format: {file_path}")
-            raise ValueError("Formato de archivo no soportado")
+        return open_archive(file_path)
 
     def get_image_files(self):
-        files = sorted([f for f in self.archive.namelist() if f.lower().endswith(('.jpg', '.jpeg', '.png'))])
-        logger.debug(f"Found {len(files)} image files in archive")
-        return files
+        return [entry['name'] for entry in self.page_index]
+
+    def build_page_index(self):
+        return build_page_index(self.archive)
+
+    def load_page_index(self):
+        """
+        Lee el índice de páginas guardado junto al .gui si corresponde al
+        archivo actual; si no, lo construye y lo guarda.
+        """
+        index_path = self.input_file + ".idx"
+        pages, saved = read_page_index(self.input_file, self.archive)
+        if saved is not None and pages is saved['pages']:
+            logger.info(f"Loaded page index: {index_path}")
+        else:
+            try:
+                save_page_index(index_path, {'signature': archive_signature(self.input_file), 'pages': pages})
+                logger.info(f"Saved page index: {index_path}")
+            except OSError as e:
+                # Carpeta de sólo lectura: el índice se queda en memoria
+                logger.warning(f"Could not save page index {index_path}: {e}")
+
+        if saved is None and (self.gui_legacy or not self.gui_found):
+            # Primera apertura con el orden natural: lo guardado antes (.gui
+            # antiguo o sólo traducciones) usa el orden lexicográfico
+            self.remap_legacy_page_order(pages)
+        elif self.gui_legacy:
+            # Con índice previo el .gui ya se había pasado a orden natural:
+            # sólo le falta la cabecera
+            self.mark_gui_natural_order()
+        return pages
+
+    def remap_legacy_page_order(self, pages):
+        """
+        Los .gui sin cabecera de formato numeran las páginas en orden
+        lexicográfico y sólo con JPG/PNG; si el orden nuevo es distinto se
+        renumeran para no mover los paneles.
+
+        Las traducciones guardadas del cómic, haya .gui o no, usan la misma
+        numeración y se renumeran también; con un .gui antiguo, sólo si se ha
+        podido reescribir (si no, se volverían a renumerar en la siguiente
+        apertura). La correspondencia queda en legacy_page_map para la página
+        guardada de la sesión anterior.
+        """
+        page_map = legacy_page_map(pages)
+        if self.gui_legacy:
+            if page_map is not None:
+                self.panel_corrections = remap_pages(self.panel_corrections, page_map)
+                logger.info("Renumbered GUI file pages to natural order")
+            self.mark_gui_natural_order()
+        if page_map is None or self.gui_legacy:
+            return
+        self.legacy_page_map = page_map
+        try:
+            for path in remap_translation_pages(self.input_file, page_map):
+                logger.info(f"Renumbered translation pages to natural order: {path}")
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Could not renumber saved translations of {self.input_file}: {e}")
+
+    def mark_gui_natural_order(self):
+        """Reescribe el .gui con la cabecera del formato actual para no volver a renumerarlo."""
+        try:
+            self.save_gui_file()
+        except OSError as e:
+            logger.warning(f"Could not rewrite GUI file in natural order: {e}")
+            return
+        self.gui_legacy = False
 
     # def extract_page(self, page_index):
     #     image_files = self.get_image_files()
@@ -44,9 +214,18 @@ class PanelManager:
 
     def load_gui_file(self):
         gui_path = self.input_file + ".gui"
-        if os.path.exists(gui_path):
+        self.journal_records = 0
+        # Se mira antes de compactar, que escribe ya con la cabecera nueva
+        self.gui_legacy = gui_is_legacy(gui_path)
+        self.gui_found = os.path.exists(gui_path) or os.path.exists(gui_journal_path(gui_path))
+        if self.gui_found:
             logger.info(f"Loading GUI file: {gui_path}")
-            return parse_gui_file(gui_path)
+            corrections = parse_gui_file(gui_path)
+            if os.path.exists(gui_journal_path(gui_path)):
+                # Se compacta al abrir para no seguir escribiendo tras un registro cortado
+                save_gui_file(gui_path, corrections)
+                logger.info("Compacted GUI journal left from previous session")
+            return corrections
         else:
             logger.info("No GUI file found, starting with empty corrections")
             return {}
@@ -107,6 +286,7 @@ class PanelManager:
         del self.panel_corrections[page][panel_index]
         if not self.panel_corrections[page]:
             del self.panel_corrections[page]
+        self.record_pages([page])
 
     # def save_gui_file(self):
     #     save_gui_file(self.input_file + ".gui", self.panel_corrections)
@@ -114,11 +294,224 @@ class PanelManager:
     def get_num_pages(self):
         return len(self.valid_files)
 
+    def cached_member_path(self, member):
+        """
+        Ruta del miembro en la caché de extracción, o None si no está o su
+        tamaño no coincide con el del índice (una extracción interrumpida).
+        """
+        path = os.path.join(self.extract_dir, member_relpath(member))
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return None
+        expected = self.member_sizes.get(member)
+        if expected is not None and size != expected:
+            logger.warning(f"Ignoring truncated cached page {path} ({size} of {expected} bytes)")
+            return None
+        return path
+
     def get_page_path(self, page_index):
-        if page_index < len(self.valid_files):
-            return os.path.join(self.extract_dir, self.valid_files[page_index])
-        else:
+        if not 0 <= page_index < len(self.valid_files):
             raise ValueError(f"No se pudo extraer la página {page_index}")
+        member = self.valid_files[page_index]
+        path = os.path.join(self.extract_dir, member_relpath(member))
+        if self.cached_member_path(member) is None:
+            # Extracción perezosa: sólo se escribe a disco la página pedida
+            with self.archive_lock:
+                data = self.archive.read(member)
+            self.extraction_cache.write_member(self.extract_dir, member, data)
+            logger.debug(f"Extracted page {page_index} on demand: {member}")
+        return path
+
+    def get_page_bytes(self, page_index):
+        """
+        Devuelve los bytes comprimidos (JPEG/PNG) de una página. Si ya está en
+        la caché de extracción se lee de disco; si no, directamente del archivo.
+        """
+        if not 0 <= page_index < len(self.valid_files):
+            raise ValueError(f"Índice de página inválido: {page_index}")
+        path = self.cached_member_path(self.valid_files[page_index])
+        if path is not None:
+            with open(path, 'rb') as f:
+                return f.read()
+        member = self.valid_files[page_index]
+        with self.archive_lock:
+            return self.archive.read(member)
+
+    def detection_key(self, data):
+        """
+        Clave de la caché de detección: hash de los bytes de la página más los
+        parámetros del detector. Una página idéntica en otra edición comparte clave.
+        """
+        return content_key(data, detector_params(self.detector_profile))
+
+    def load_detector_profile(self):
+        """Perfil de detección elegido para este cómic, guardado en `<cómic>.profile`."""
+        try:
+            with open(self.input_file + ".profile", 'r', encoding='utf-8') as f:
+                profile = json.load(f).get('profile')
+        except (OSError, ValueError, AttributeError):
+            return DEFAULT_DETECTOR_PROFILE
+        if profile not in DETECTOR_PROFILES:
+            logger.warning(f"Unknown detector profile '{profile}', using default")
+            return DEFAULT_DETECTOR_PROFILE
+        return profile
+
+    def set_detector_profile(self, profile):
+        if profile not in DETECTOR_PROFILES:
+            raise ValueError(f"Perfil de detección desconocido: {profile}")
+        self.detector_profile = profile
+        write_file_atomic(self.input_file + ".profile", json.dumps({'profile': profile}).encode('utf-8'))
+        logger.info(f"Detector profile for {self.input_file} set to {profile}")
+
+    def cached_detection(self, key):
+        panels = self.detection_cache.get(key)
+        if panels is None:
+            return None
+        return [tuple(panel) for panel in panels]
+
+    def store_detection(self, key, panels):
+        self.detection_cache.put(key, [list(panel) for panel in panels])
+
+    def page_cache_key(self, page_index, scale):
+        return page_index if scale == 1 else (page_index, scale)
+
+    def decode_page(self, page_index, box=None):
+        """
+        Decodifica una página y devuelve (clave de caché, imagen).
+
+        Con `box` (tamaño del lienzo) los JPEG se decodifican con Image.draft a
+        1/2, 1/4 o 1/8 de escala: la menor resolución que sigue cubriendo el
+        lienzo. Sin `box` se decodifica a resolución completa.
+        """
+        image = Image.open(io.BytesIO(self.get_page_bytes(page_index)))
+        self.page_sizes[page_index] = image.size
+        scale = 1
+        if box and image.format == 'JPEG':
+            scale = draft_scale(image.size, fit_size(image.size, box))
+            if scale > 1:
+                image.draft(None, (image.width // scale, image.height // scale))
+        image.load()
+        return self.page_cache_key(page_index, scale), image
+
+    def decode_page_levels(self, page_index, box=None):
+        """
+        Decodifica una página y genera a partir de ella los niveles más
+        pequeños de la pirámide (PYRAMID_SCALES) con Image.reduce, que es
+        mucho más barato que volver a remuestrear la página completa.
+        Devuelve [(clave de caché, imagen), ...] de mayor a menor resolución.
+        """
+        key, image = self.decode_page(page_index, box)
+        scale = key[1] if isinstance(key, tuple) else 1
+        levels = [(key, image)]
+        for s in PYRAMID_SCALES:
+            if s <= scale:
+                continue
+            image = image.reduce(s // scale)
+            scale = s
+            levels.append((self.page_cache_key(page_index, s), image))
+        return levels
+
+    def cache_levels(self, levels):
+        # El nivel más fino se guarda el último para que sea el último en expulsarse
+        for key, image in reversed(levels):
+            self.page_cache.put(key, image)
+        return levels[0][1]
+
+    def get_page_image(self, page_index):
+        """
+        Devuelve la página decodificada a resolución completa (recortes de
+        paneles, OCR), usando la caché compartida. No debe modificarse en sitio.
+        """
+        image = self.page_cache.get(page_index)
+        if image is None:
+            image = self.cache_levels(self.decode_page_levels(page_index))
+            logger.debug(f"Decoded page {page_index} ({self.page_cache.current_bytes / 1048576:.1f} MB cached)")
+        return image
+
+    def cached_screen_image(self, page_index, box=None):
+        """
+        Nivel más pequeño de la pirámide que sigue cubriendo `box`, o None si
+        no hay ninguno en caché con resolución suficiente.
+        """
+        size = self.page_sizes.get(page_index)
+        if box is None or size is None:
+            return self.page_cache.get(page_index)
+        scale = draft_scale(size, fit_size(size, box))
+        for s in (8, 4, 2, 1):
+            if s <= scale:
+                image = self.page_cache.get(self.page_cache_key(page_index, s))
+                if image is not None:
+                    return image
+        return None
+
+    def get_screen_image(self, page_index, box):
+        """
+        Devuelve la página a la resolución mínima necesaria para mostrarla
+        ajustada a un lienzo de tamaño `box`.
+        """
+        image = self.cached_screen_image(page_index, box)
+        if image is None:
+            image = self.cache_levels(self.decode_page_levels(page_index, box))
+            logger.debug(f"Decoded page {page_index} for screen ({image.width}x{image.height})")
+        return image
+
+    def render_region(self, page_index, bbox, box, resample=Image.LANCZOS):
+        """
+        Devuelve la página (bbox=None) o el panel `bbox` ajustado a `box` sin
+        ampliarlo, como hacía thumbnail().
+
+        No se copia ni se recorta la página: se remuestrea directamente la
+        región desde el nivel de la pirámide adecuado con resize(box=...). El
+        resultado final (LANCZOS) se guarda en la caché de renderizado con la
+        clave (página, bbox, box), así que repintar o volver a un panel ya
+        visto no reserva memoria nueva. No debe modificarse en sitio. Las
+        vistas previas con otro filtro (BILINEAR mientras se arrastra el borde
+        de la ventana) no se guardan: cada una tiene un tamaño distinto y sólo
+        llenarían la caché.
+
+        Un panel que se sale de la página se ajusta a sus límites; si queda
+        vacío se devuelve None.
+        """
+        bbox = tuple(bbox) if bbox is not None else None
+        key = (page_index, bbox, box)
+        final = resample == Image.LANCZOS
+        image = self.render_cache.get(key)
+        if image is not None:
+            return image
+
+        if bbox is None:
+            source = self.get_screen_image(page_index, box)
+            target = fit_size(source.size, box)
+            target = (min(target[0], source.width), min(target[1], source.height))
+            image = source if target == source.size else source.resize(target, resample)
+        else:
+            if page_index not in self.page_sizes:
+                self.get_page_image(page_index)
+            # resize(box=...) no admite cajas fuera de la imagen, a diferencia de crop()
+            clamped = clamp_box(bbox, self.page_sizes[page_index])
+            if clamped is None:
+                logger.warning(f"Panel {bbox} lies outside page {page_index + 1}")
+                return None
+            x1, y1, x2, y2 = clamped
+            region_size = (max(1, x2 - x1), max(1, y2 - y1))
+            target = fit_size(region_size, box)
+            target = (min(target[0], region_size[0]), min(target[1], region_size[1]))
+            wanted_scale = draft_scale(region_size, target)
+            source, scale = None, 1
+            for s in sorted(PYRAMID_SCALES, reverse=True):
+                if s <= wanted_scale:
+                    source = self.page_cache.get(self.page_cache_key(page_index, s))
+                    if source is not None:
+                        scale = s
+                        break
+            if source is None:
+                source, scale = self.get_page_image(page_index), 1
+            image = source.resize(target, resample, box=(x1 / scale, y1 / scale, x2 / scale, y2 / scale))
+
+        if final:
+            self.render_cache.put(key, image)
+        return image
 
     def extract_page(self, page_index):
         page_path = self.get_page_path(page_index)
@@ -127,24 +520,53 @@ class PanelManager:
     # def set_panels(self, page, panels):
     #     self.panel_corrections[page] = panels
         
-    def __init__(self, input_file):
+    def __init__(self, input_file, lazy=True, cache_mb=PAGE_CACHE_MB, render_cache_mb=RENDER_CACHE_MB):
         self.input_file = input_file
-        self.extract_dir = 'extracted_comic'
-        ensure_directory_exists(self.extract_dir)
+        self.page_cache = PageCache(cache_mb)
+        self.render_cache = PageCache(render_cache_mb)
+        self.page_sizes = {}
+        self.extraction_cache = ExtractionCache()
+        self.extract_dir = self.extraction_cache.directory_for(input_file)
+        self.detection_cache = DiskCache(DETECTION_CACHE_DIR, DETECTION_CACHE_MB)
+        self.detector_profile = self.load_detector_profile()
         self.panel_corrections = self.load_gui_file()
+        # Lotes abiertos con begin_batch; mientras haya alguno no se escribe el .gui
+        self.batch_depth = 0
+        self.batch_pages = set()
         self.valid_files = []
+        # zipfile/rarfile no son seguros para lecturas concurrentes
+        self.archive_lock = threading.Lock()
         self.archive = self.open_archive(input_file)
-        self.valid_files = self.extract_all_files()        
+        # {página antigua: página nueva} si al abrir se ha pasado un .gui antiguo a orden natural
+        self.legacy_page_map = None
+        self.page_index = self.load_page_index()
+        self.member_sizes = {entry['name']: entry['file_size'] for entry in self.page_index}
+        if lazy:
+            # Las páginas se leen del archivo la primera vez que se piden
+            self.valid_files = self.get_image_files()
+        else:
+            self.valid_files = self.extract_all_files()
+        self.extraction_cache.enforce_limit(keep=self.extract_dir)
+        logger.info(f"PanelManager initialized for {input_file} ({len(self.valid_files)} pages, lazy={lazy})")
         
-    def extract_all_files(self):
-        valid_files = []
+    def extract_all_files(self, workers=None):
+        """
+        Extrae todas las páginas que aún no estén en la caché de extracción.
+        Los ZIP se reparten entre procesos y los RAR se extraen con una sola
+        llamada a unrar.
+        """
         image_files = self.get_image_files()
-        for file in image_files:
+        missing = [f for f in image_files if self.cached_member_path(f) is None]
+        if missing:
             try:
-                self.archive.extract(file, path=self.extract_dir)
-                valid_files.append(file)
-            except (zipfile.BadZipFile, KeyError) as e:
-                print(f"Error al extraer el archivo {file}: {e}")
+                extracted, rate = extract_members(self.input_file, missing, self.extract_dir, workers)
+                logger.info(f"Extracted {len(extracted)} of {len(missing)} pages ({rate:.1f} pages/s)")
+            except (zipfile.BadZipFile, rarfile.Error, OSError) as e:
+                logger.error(f"Error extracting {self.input_file}: {e}")
+                print(f"Error al extraer el archivo {self.input_file}: {e}")
+            # Las páginas no pasan por write_member: se mide la carpeta una vez
+            self.extraction_cache.measure(self.extract_dir)
+        valid_files = [f for f in image_files if self.cached_member_path(f) is not None]
         return valid_files            
     
     
@@ -159,14 +581,82 @@ class PanelManager:
         """
         logger.info(f"Setting panels for page {page + 1}")
         self.panel_corrections[page] = panels
-        self.save_gui_file()
+        if self.batch_depth:
+            self.batch_pages.add(page)
+        else:
+            self.record_pages([page])
         logger.info(f"Set {len(panels)} panels for page {page + 1}") 
+
+    def begin_batch(self):
+        """
+        Abre un lote: los cambios de set_panels se acumulan en memoria y se
+        escriben juntos en commit_batch. Los lotes pueden anidarse.
+        """
+        self.batch_depth += 1
+
+    def commit_batch(self):
+        """Cierra un lote y, si era el más externo, guarda los cambios pendientes."""
+        if self.batch_depth == 0:
+            logger.warning("commit_batch called without an open batch")
+            return
+        self.batch_depth -= 1
+        if self.batch_depth == 0 and self.batch_pages:
+            pages = sorted(self.batch_pages)
+            self.batch_pages = set()
+            self.record_pages(pages)
+
+    @contextmanager
+    def batch(self):
+        """
+        Uso: `with panel_manager.batch(): ...` agrupa varias llamadas a
+        set_panels en una única escritura, incluso si hay una excepción.
+        """
+        self.begin_batch()
+        try:
+            yield self
+        finally:
+            self.commit_batch()
     
     
+    def record_pages(self, pages):
+        """
+        Añade al diario .gui.journal el estado actual de `pages`. Cuando el
+        diario pasa de GUI_JOURNAL_MAX_RECORDS registros se compacta en el .gui.
+        """
+        records = [(page, self.panel_corrections.get(page)) for page in pages]
+        if self.journal_records + len(records) >= GUI_JOURNAL_MAX_RECORDS:
+            self.save_gui_file()
+            return
+        try:
+            append_gui_journal(self.input_file + ".gui", records)
+            self.journal_records += len(records)
+        except OSError as e:
+            logger.error(f"Error appending to GUI journal: {e}")
+            self.save_gui_file()
+
     def save_gui_file(self):
+        """Escribe la instantánea .gui completa y vacía el diario."""
         gui_path = self.input_file + ".gui"
         save_gui_file(gui_path, self.panel_corrections)
+        self.journal_records = 0
         logger.info(f"Saved GUI file: {gui_path}")    
+
+    def close(self):
+        """Compacta el diario de correcciones y cierra el archivo del cómic."""
+        if self.batch_pages or self.journal_records:
+            # La instantánea se escribe desde memoria, así que cubre también un lote abierto
+            self.batch_depth = 0
+            self.batch_pages = set()
+            self.save_gui_file()
+        with self.archive_lock:
+            try:
+                self.archive.close()
+            except Exception as e:
+                logger.warning(f"Error closing archive {self.input_file}: {e}")
+        stats = self.detection_cache.stats()
+        self.detection_cache.close()
+        logger.info(f"PanelManager closed for {self.input_file} (detection cache: {stats['hits']} hits, "
+                    f"{stats['misses']} misses, {stats['hit_rate']:.0%} hit rate)")
         
     
     
@@ -1,6 +1,7 @@
 import tkinter as tk
 from tkinter import Toplevel, Canvas, Button, Scrollbar, messagebox
 from PIL import Image, ImageTk
+from panel_manager import clamp_box
 import math
 import logging
 import sys
@@ -77,11 +78,15 @@ class PanelOrderEditor:
     def load_thumbnails(self):
         self.canvas.delete('all')
         self.thumbnails = []
+        page_image = self.panel_manager.get_page_image(self.page)
         for i, (x1, y1, x2, y2) in enumerate(self.panel_images):
-            image = Image.open(self.panel_manager.get_page_path(self.page)).crop((x1, y1, x2, y2))
-            thumbnail = ImageTk.PhotoImage(image.resize((100, 100), Image.LANCZOS))
-            self.thumbnails.append(thumbnail)
-            self.canvas.create_image(10, i * 170 + 10, image=thumbnail, anchor='nw', tags=(f'thumbnail{i}', 'thumbnail'))
+            # resize(box=...) lee la región directamente, sin copiar el recorte,
+            # pero la caja tiene que estar dentro de la página
+            box = clamp_box((x1, y1, x2, y2), page_image.size)
+            if box is not None:
+                thumbnail = ImageTk.PhotoImage(page_image.resize((100, 100), Image.LANCZOS, box=box))
+                self.thumbnails.append(thumbnail)
+                self.canvas.create_image(10, i * 170 + 10, image=thumbnail, anchor='nw', tags=(f'thumbnail{i}', 'thumbnail'))
             
             angle, hypotenuse = self.calculate_angle_and_hypotenuse(x1, y1)
             
@@ -0,0 +1,155 @@
+"""
+Almacén binario de paneles, alternativo al formato de texto .gui.
+
+Estructura del archivo (little-endian):
+
+    cabecera   16 bytes   magic b'CVPS', versión (uint32), nº de páginas (uint32), reservado (uint32)
+    tabla      16 bytes por página, ordenada por página:
+               página (int32), nº de paneles (uint32), desplazamiento (uint64)
+    datos      por página, nº de paneles x 4 int32 (x1, y1, x2, y2)
+
+El lector abre el archivo con mmap y usa numpy.frombuffer, así que consultar
+una página sólo toca la tabla (búsqueda binaria) y los bytes de esa página.
+
+Uso desde línea de comandos:
+
+    python panel_store.py to-store comic.cbz.gui [comic.cbz.panels]
+    python panel_store.py to-gui comic.cbz.panels salida.gui
+"""
+import argparse
+import mmap
+import os
+import struct
+import numpy as np
+from utils import parse_gui_file, save_gui_file, write_file_atomic, gui_journal_path
+
+MAGIC = b'CVPS'
+VERSION = 1
+HEADER = struct.Struct('<4sIII')
+TABLE_DTYPE = np.dtype([('page', '<i4'), ('count', '<u4'), ('offset', '<u8')])
+COORD_DTYPE = np.dtype('<i4')
+STORE_EXTENSION = '.panels'
+
+
+def write_panel_store(store_path, panels):
+    """Escribe `panels` ({página: [(x1, y1, x2, y2), ...]}) en formato binario, de forma atómica."""
+    pages = sorted(panels)
+    table = np.zeros(len(pages), dtype=TABLE_DTYPE)
+    offset = HEADER.size + table.nbytes
+    chunks = []
+    for i, page in enumerate(pages):
+        coords = np.asarray(panels[page], dtype=COORD_DTYPE).reshape(-1, 4)
+        table[i] = (page, len(coords), offset)
+        chunks.append(coords.tobytes())
+        offset += coords.nbytes
+    header = HEADER.pack(MAGIC, VERSION, len(pages), 0)
+    write_file_atomic(store_path, header + table.tobytes() + b''.join(chunks))
+
+
+class PanelStore:
+    """
+    Lector de solo lectura sobre un archivo de paneles binario mapeado en memoria.
+
+    La tabla se consulta directamente sobre el mmap; get_array devuelve una
+    copia de los paneles de la página (unos pocos bytes), así que los arrays
+    siguen siendo válidos después de close().
+    """
+
+    def __init__(self, store_path):
+        self.store_path = store_path
+        with open(store_path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._mmap) < HEADER.size:
+            self._mmap.close()
+            raise ValueError(f"Archivo de paneles inválido: {store_path}")
+        magic, version, page_count, _ = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != VERSION:
+            self._mmap.close()
+            raise ValueError(f"Archivo de paneles inválido o de otra versión: {store_path}")
+        self._table = np.frombuffer(self._mmap, dtype=TABLE_DTYPE, count=page_count, offset=HEADER.size)
+
+    def __len__(self):
+        return len(self._table)
+
+    def __contains__(self, page):
+        return self._find(page) is not None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _find(self, page):
+        i = int(np.searchsorted(self._table['page'], page))
+        if i < len(self._table) and self._table['page'][i] == page:
+            return i
+        return None
+
+    def pages(self):
+        return self._table['page'].tolist()
+
+    def get_array(self, page):
+        """Paneles de `page` como array int32 de forma (n, 4); vacío si la página no tiene."""
+        i = self._find(page)
+        if i is None:
+            return np.empty((0, 4), dtype=COORD_DTYPE)
+        count = int(self._table['count'][i])
+        offset = int(self._table['offset'][i])
+        # Copia: una vista mantendría exportado el buffer y close() fallaría con BufferError
+        return np.frombuffer(self._mmap, dtype=COORD_DTYPE, count=count * 4, offset=offset).reshape(count, 4).copy()
+
+    def get_panels(self, page):
+        """Paneles de `page` como lista de tuplas, igual que PanelManager.get_panels."""
+        return [tuple(panel) for panel in self.get_array(page).tolist()]
+
+    def to_dict(self):
+        return {page: self.get_panels(page) for page in self.pages()}
+
+    def close(self):
+        # Las vistas de numpy mantienen el buffer exportado; se sueltan antes de cerrar
+        self._table = None
+        self._mmap.close()
+
+
+def gui_to_store(gui_path, store_path=None):
+    """Convierte un .gui de texto (más su diario) al formato binario."""
+    store_path = store_path or gui_path + STORE_EXTENSION
+    write_panel_store(store_path, parse_gui_file(gui_path))
+    return store_path
+
+
+def store_to_gui(store_path, gui_path):
+    """
+    Convierte un archivo binario de paneles al formato .gui de texto en
+    `gui_path`. Se niega a escribir sobre un .gui con diario pendiente, que
+    se perdería (save_gui_file lo borra al escribir la instantánea).
+    """
+    if os.path.exists(gui_journal_path(gui_path)):
+        raise ValueError(f"{gui_path} tiene correcciones sin compactar en {gui_journal_path(gui_path)}; "
+                         "abra el cómic para compactarlas o use otra ruta de salida")
+    with PanelStore(store_path) as store:
+        panels = store.to_dict()
+    save_gui_file(gui_path, panels)
+    return gui_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convierte paneles entre el formato .gui y el binario")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    to_store = subparsers.add_parser('to-store', help=".gui de texto -> binario")
+    to_store.add_argument('gui_path')
+    to_store.add_argument('store_path', nargs='?')
+    to_gui = subparsers.add_parser('to-gui', help="binario -> .gui de texto")
+    to_gui.add_argument('store_path')
+    to_gui.add_argument('gui_path')
+    args = parser.parse_args()
+
+    if args.command == 'to-store':
+        print(gui_to_store(args.gui_path, args.store_path))
+    else:
+        print(store_to_gui(args.store_path, args.gui_path))
+
+
+if __name__ == "__main__":
+    main()
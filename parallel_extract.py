@@ -0,0 +1,86 @@
+import os
+import shutil
+import tempfile
+import time
+import zipfile
+import zlib
+import rarfile
+from concurrent.futures import ProcessPoolExecutor
+from logger import logger
+from utils import ensure_directory_exists, member_relpath, write_file_atomic
+
+# Por debajo de este número de páginas no compensa arrancar procesos
+MIN_PARALLEL_MEMBERS = 16
+
+
+def _extract_zip_chunk(archive_path, members, dest_dir):
+    """Extrae un grupo de miembros abriendo un ZipFile propio en el proceso de trabajo."""
+    extracted = []
+    with zipfile.ZipFile(archive_path) as zf:
+        for member in members:
+            try:
+                write_file_atomic(os.path.join(dest_dir, member_relpath(member)), zf.read(member))
+                extracted.append(member)
+            except (zipfile.BadZipFile, KeyError, OSError, zlib.error) as e:
+                logger.error(f"Error extracting {member}: {e}")
+    return extracted
+
+
+def extract_zip_parallel(archive_path, members, dest_dir, workers=None):
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(members) < MIN_PARALLEL_MEMBERS:
+        return _extract_zip_chunk(archive_path, members, dest_dir)
+
+    # Varios grupos por proceso para repartir bien páginas de distinto tamaño
+    n_chunks = min(len(members), workers * 4)
+    chunks = [members[i::n_chunks] for i in range(n_chunks)]
+    extracted = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for done in executor.map(_extract_zip_chunk, [archive_path] * n_chunks, chunks, [dest_dir] * n_chunks):
+            extracted.extend(done)
+    return extracted
+
+
+def extract_rar_bulk(archive_path, members, dest_dir):
+    """
+    Una sola llamada a unrar para todos los miembros, en lugar de una por
+    página. Se abre un RarFile propio en lugar de usar el compartido, así que
+    las lecturas de página de la interfaz no esperan a que termine. Se extrae
+    en un directorio temporal dentro de `dest_dir` y cada página se renombra a
+    su sitio al terminar: una extracción interrumpida no deja páginas
+    truncadas en la caché.
+    """
+    ensure_directory_exists(dest_dir)
+    tmp_dir = tempfile.mkdtemp(prefix='.extract_', dir=dest_dir)
+    extracted = []
+    try:
+        with rarfile.RarFile(archive_path) as archive:
+            archive.extractall(path=tmp_dir, members=members)
+        for member in members:
+            relpath = member_relpath(member)
+            source = os.path.join(tmp_dir, relpath)
+            if not os.path.exists(source):
+                continue
+            target = os.path.join(dest_dir, relpath)
+            ensure_directory_exists(os.path.dirname(target) or dest_dir)
+            os.replace(source, target)
+            extracted.append(member)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return extracted
+
+
+def extract_members(archive_path, members, dest_dir, workers=None):
+    """
+    Extrae `members` en `dest_dir` y devuelve (extraídos, páginas por segundo).
+    Se abre el archivo de nuevo (uno por proceso en los ZIP) en lugar de usar
+    el handle compartido de PanelManager.
+    """
+    start = time.perf_counter()
+    if archive_path.lower().endswith(('.cbr', '.rar')):
+        extracted = extract_rar_bulk(archive_path, members, dest_dir)
+    else:
+        extracted = extract_zip_parallel(archive_path, members, dest_dir, workers)
+    elapsed = time.perf_counter() - start
+    rate = len(extracted) / elapsed if elapsed > 0 else float('inf')
+    return extracted, rate
@@ -0,0 +1,102 @@
+import queue
+from concurrent.futures import ThreadPoolExecutor
+from logger import logger
+from constants import PREFETCH_DEPTH, PREFETCH_WORKERS
+
+
+class PagePrefetcher:
+    """
+    Decodifica en segundo plano las páginas cercanas a la actual
+    (N+1..N+depth y N-1) y las deja en la caché de PanelManager.
+
+    Los hilos de trabajo sólo decodifican; los resultados vuelven al hilo de
+    Tk mediante root.after, que es quien los guarda en la caché. Los trabajos
+    de páginas que ya no están en la ventana se cancelan o se descartan.
+    """
+
+    def __init__(self, root, panel_manager, depth=PREFETCH_DEPTH, workers=PREFETCH_WORKERS, poll_ms=30):
+        self.root = root
+        self.panel_manager = panel_manager
+        self.depth = depth
+        self.poll_ms = poll_ms
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='prefetch')
+        self.pending = {}
+        self.wanted = set()
+        self.results = queue.Queue()
+        self.poll_id = None
+
+    def window(self, page):
+        num_pages = self.panel_manager.get_num_pages()
+        pages = list(range(page + 1, page + 1 + self.depth)) + [page - 1]
+        return [p for p in pages if 0 <= p < num_pages]
+
+    def schedule(self, page, box=None):
+        """
+        Prepara las páginas alrededor de `page` y cancela las que sobran.
+        Con `box` se preparan a resolución de pantalla; sin él, a resolución
+        completa (modo paneles).
+        """
+        pages = self.window(page)
+        self.wanted = set(pages)
+
+        for p, (future, job_box) in list(self.pending.items()):
+            if (p not in self.wanted or job_box != box) and future.cancel():
+                del self.pending[p]
+                logger.debug(f"Prefetch of page {p} cancelled")
+
+        for p in pages:
+            if p in self.pending or self.panel_manager.cached_screen_image(p, box) is not None:
+                continue
+            future = self.executor.submit(self.panel_manager.decode_page_levels, p, box)
+            future.add_done_callback(lambda f, p=p: self.results.put((p, f)))
+            self.pending[p] = (future, box)
+
+        if self.pending and self.poll_id is None:
+            self.poll_id = self.root.after(self.poll_ms, self.drain)
+
+    def drain(self):
+        self.poll_id = None
+        while True:
+            try:
+                page, future = self.results.get_nowait()
+            except queue.Empty:
+                break
+            if page in self.pending and self.pending[page][0] is future:
+                del self.pending[page]
+            if future.cancelled():
+                continue
+            if page not in self.wanted:
+                logger.debug(f"Dropping stale prefetch of page {page}")
+                continue
+            error = future.exception()
+            if error is not None:
+                logger.warning(f"Prefetch of page {page} failed: {error}")
+                continue
+            self.panel_manager.cache_levels(future.result())
+            logger.debug(f"Prefetched page {page + 1}")
+
+        if self.pending:
+            self.poll_id = self.root.after(self.poll_ms, self.drain)
+
+    def get_screen_image(self, page, box=None):
+        """
+        Igual que PanelManager.get_screen_image, pero si la página se está
+        decodificando en segundo plano espera a ese trabajo en vez de repetirlo.
+        """
+        image = self.panel_manager.cached_screen_image(page, box)
+        if image is not None:
+            return image
+        future, _ = self.pending.pop(page, (None, None))
+        if future is not None and not future.cancel():
+            self.panel_manager.cache_levels(future.result())
+        if box is None:
+            return self.panel_manager.get_page_image(page)
+        return self.panel_manager.get_screen_image(page, box)
+
+    def shutdown(self):
+        if self.poll_id is not None:
+            self.root.after_cancel(self.poll_id)
+            self.poll_id = None
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.pending.clear()
+        self.wanted = set()
@@ -0,0 +1,42 @@
+from PIL import Image
+from constants import RESIZE_IDLE_MS
+
+
+class RenderScheduler:
+    """
+    Agrupa las peticiones de redibujado de un lienzo mientras se redimensiona.
+
+    Cada petición programa (una sola vez por ciclo de eventos) una vista
+    previa rápida con BILINEAR y reprograma la pasada final de calidad
+    (LANCZOS), que sólo se ejecuta cuando han pasado `idle_ms` sin nuevas
+    peticiones. Una petición nueva sustituye a la final pendiente.
+    """
+
+    def __init__(self, root, render, idle_ms=RESIZE_IDLE_MS):
+        self.root = root
+        self.render = render
+        self.idle_ms = idle_ms
+        self.preview_id = None
+        self.final_id = None
+
+    def request(self):
+        if self.final_id is not None:
+            self.root.after_cancel(self.final_id)
+        if self.preview_id is None:
+            self.preview_id = self.root.after_idle(self._render_preview)
+        self.final_id = self.root.after(self.idle_ms, self._render_final)
+
+    def cancel(self):
+        for after_id in (self.preview_id, self.final_id):
+            if after_id is not None:
+                self.root.after_cancel(after_id)
+        self.preview_id = None
+        self.final_id = None
+
+    def _render_preview(self):
+        self.preview_id = None
+        self.render(Image.BILINEAR)
+
+    def _render_final(self):
+        self.final_id = None
+        self.render(Image.LANCZOS)
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""
+Barrido de parámetros del detector de paneles contra cómics con paneles ya
+corregidos a mano (su `.gui` hace de verdad de referencia).
+
+Para cada combinación se detectan los paneles de todas las páginas anotadas y
+se informa precisión, exhaustividad (un panel cuenta como acierto si su IoU
+con uno de referencia es >= --iou) y ms por página. Al final se indica la
+combinación más rápida que cumple --min-precision y --min-recall.
+
+Uso:
+    python sweep_detector_params.py comic1.cbz [comic2.cbr ...]
+    python sweep_detector_params.py comic.cbz --profiles manga western
+    python sweep_detector_params.py comic.cbz --base manga --grid block_size=11,15,21 c=2,4 analysis_height=0,800,1200
+
+En --grid, analysis_height=0 significa resolución completa.
+"""
+
+import argparse
+import itertools
+import os
+import statistics
+import sys
+import time
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, REPO_DIR)
+
+from constants import DETECTOR_PROFILES, DEFAULT_DETECTOR_PROFILE
+from panel_manager import open_archive, read_page_index, legacy_page_map, remap_pages
+from utils import parse_gui_file, gui_is_legacy, gui_journal_path
+from panel_recalculation import recalcular_paneles
+from benchmark_panel_detection import iou
+
+GRID_TYPES = {'block_size': int, 'c': float, 'kernel': int, 'min_area_ratio': float, 'analysis_height': int}
+
+
+def load_ground_truth(comic_path):
+    """
+    Devuelve [(bytes de la página, paneles de referencia)] para las páginas
+    anotadas del cómic, con el mismo índice de páginas que PanelManager y la
+    renumeración de los .gui en el formato antiguo. Sólo lee: no reescribe el
+    .gui ni su diario, no guarda el .idx y no usa las cachés en disco.
+    """
+    gui_path = comic_path + '.gui'
+    if not os.path.exists(gui_path) and not os.path.exists(gui_journal_path(gui_path)):
+        print(f"Sin paneles de referencia para {comic_path} (falta {gui_path})")
+        return []
+    legacy = gui_is_legacy(gui_path)
+    corrections = parse_gui_file(gui_path)
+    with open_archive(comic_path) as archive:
+        pages, saved = read_page_index(comic_path, archive)
+        if legacy and saved is None:
+            page_map = legacy_page_map(pages)
+            if page_map is not None:
+                corrections = remap_pages(corrections, page_map)
+        return [(archive.read(pages[page]['name']), panels) for page, panels in sorted(corrections.items())
+                if 0 <= page < len(pages) and panels]
+
+
+def match_panels(reference, detected, threshold):
+    """Emparejamiento voraz por IoU; devuelve el número de aciertos."""
+    pairs = sorted(((iou(r, d), i, j) for i, r in enumerate(reference) for j, d in enumerate(detected)), reverse=True)
+    used_reference, used_detected = set(), set()
+    for score, i, j in pairs:
+        if score < threshold:
+            break
+        if i in used_reference or j in used_detected:
+            continue
+        used_reference.add(i)
+        used_detected.add(j)
+    return len(used_reference)
+
+
+def evaluate(pages, profile, overrides, threshold):
+    true_positives = detected_total = reference_total = 0
+    times = []
+    for data, reference in pages:
+        start = time.perf_counter()
+        detected = recalcular_paneles(data, profile, **overrides)
+        times.append((time.perf_counter() - start) * 1000)
+        true_positives += match_panels(reference, detected, threshold)
+        detected_total += len(detected)
+        reference_total += len(reference)
+    precision = true_positives / detected_total if detected_total else 0.0
+    recall = true_positives / reference_total if reference_total else 0.0
+    return precision, recall, statistics.mean(times)
+
+
+def parse_grid(items):
+    axes = []
+    for item in items:
+        name, _, values = item.partition('=')
+        if name not in GRID_TYPES or not values:
+            raise SystemExit(f"Parámetro de --grid no válido: {item} (use {', '.join(GRID_TYPES)})")
+        parsed = [GRID_TYPES[name](v) for v in values.split(',')]
+        # adaptiveThreshold sólo admite bloques impares de 3 o más
+        if name == 'block_size' and any(v < 3 or v % 2 == 0 for v in parsed):
+            raise SystemExit(f"block_size debe ser impar y >= 3: {values}")
+        if name == 'analysis_height':
+            parsed = [v or None for v in parsed]
+        axes.append([(name, v) for v in parsed])
+    return [dict(combo) for combo in itertools.product(*axes)]
+
+
+def describe(profile, overrides):
+    if not overrides:
+        return profile
+    return profile + ' ' + ' '.join(f"{k}={v}" for k, v in overrides.items())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Barrido de parámetros del detector de paneles")
+    parser.add_argument('comics', nargs='+', help="cómics .cbz/.cbr con su .gui corregido al lado")
+    parser.add_argument('--profiles', nargs='*', default=None,
+                        help="perfiles a comparar (por defecto todos los de DETECTOR_PROFILES)")
+    parser.add_argument('--base', default=DEFAULT_DETECTOR_PROFILE, help="perfil base para --grid")
+    parser.add_argument('--grid', nargs='*', default=None, help="rejilla nombre=v1,v2 sobre el perfil base")
+    parser.add_argument('--iou', type=float, default=0.5, help="IoU mínimo para contar un acierto")
+    parser.add_argument('--min-precision', type=float, default=0.9)
+    parser.add_argument('--min-recall', type=float, default=0.9)
+    parser.add_argument('--limit', type=int, default=None, help="máximo de páginas por cómic")
+    args = parser.parse_args()
+
+    pages = []
+    for comic in args.comics:
+        comic_pages = load_ground_truth(comic)
+        pages.extend(comic_pages[:args.limit] if args.limit else comic_pages)
+    if not pages:
+        print("No hay páginas con paneles de referencia")
+        return
+
+    if args.grid:
+        configs = [(args.base, overrides) for overrides in parse_grid(args.grid)]
+    else:
+        names = args.profiles or list(DETECTOR_PROFILES)
+        unknown = [name for name in names if name not in DETECTOR_PROFILES]
+        if unknown:
+            raise SystemExit(f"Perfiles desconocidos: {', '.join(unknown)}")
+        configs = [(name, {}) for name in names]
+
+    print(f"{len(pages)} páginas anotadas, {len(configs)} combinaciones, IoU >= {args.iou}")
+    print(f"{'configuración':<60} {'precisión':>9} {'exhaust.':>9} {'ms/pág':>8}")
+    results = []
+    for profile, overrides in configs:
+        precision, recall, ms = evaluate(pages, profile, overrides, args.iou)
+        results.append((ms, precision, recall, describe(profile, overrides)))
+        print(f"{describe(profile, overrides)[:60]:<60} {precision:>9.3f} {recall:>9.3f} {ms:>8.1f}")
+
+    good = [r for r in results if r[1] >= args.min_precision and r[2] >= args.min_recall]
+    print()
+    if good:
+        ms, precision, recall, name = min(good)
+        print(f"Más rápida con precisión >= {args.min_precision} y exhaustividad >= {args.min_recall}: "
+              f"{name} ({ms:.1f} ms/página, P={precision:.3f}, R={recall:.3f})")
+    else:
+        print(f"Ninguna combinación alcanza precisión >= {args.min_precision} y exhaustividad >= {args.min_recall}")
+
+
+if __name__ == "__main__":
+    main()
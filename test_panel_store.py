@@ -0,0 +1,38 @@
+import pytest
+from panel_store import PanelStore, write_panel_store, store_to_gui
+from utils import parse_gui_file, gui_journal_path
+
+PANELS = {0: [(0, 0, 10, 20), (10, 0, 30, 20)], 3: [(1, 2, 3, 4)], 7: []}
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / 'comic.cbz.panels')
+    write_panel_store(path, PANELS)
+    with PanelStore(path) as store:
+        assert store.pages() == [0, 3, 7]
+        assert store.to_dict() == PANELS
+        assert 5 not in store
+        assert store.get_array(5).shape == (0, 4)
+
+
+def test_close_with_live_arrays(tmp_path):
+    path = str(tmp_path / 'comic.cbz.panels')
+    write_panel_store(path, PANELS)
+    with PanelStore(path) as store:
+        array = store.get_array(3)
+    assert array.tolist() == [[1, 2, 3, 4]]
+
+
+def test_store_to_gui_keeps_journal(tmp_path):
+    gui_path = str(tmp_path / 'comic.cbz.gui')
+    path = str(tmp_path / 'comic.cbz.panels')
+    write_panel_store(path, PANELS)
+    with open(gui_journal_path(gui_path), 'w') as f:
+        f.write('page9: 0_0;1_1\n')
+    with pytest.raises(ValueError):
+        store_to_gui(path, gui_path)
+    assert parse_gui_file(gui_path) == {9: [(0, 0, 1, 1)]}
+
+    other = str(tmp_path / 'other.gui')
+    store_to_gui(path, other)
+    assert parse_gui_file(other) == PANELS
@@ -1,7 +1,9 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, simpledialog, TclError, SEL_FIRST, SEL_LAST, END
 from PIL import Image, ImageTk
-import pytesseract
+from ocr_engine import get_ocr_engine
+from ocr_pipeline import get_ocr_store, text_in_box
+from balloon_detection import detect_balloons
 from googletrans import Translator
 import json
 import os
@@ -9,7 +11,6 @@ import openai
 import urllib.parse
 import pyperclip
 import webbrowser
-import cv2
 import numpy as np
 
 class TranslationEditor:
@@ -47,6 +48,7 @@ class TranslationEditor:
         self.create_ui()  # Primero creamos la UI
         self.load_saved_translations()
         self.detect_text_areas()
+        self.show_stored_ocr()
         self.load_api_keys()
         self.adjust_window_size()  # Luego ajustamos el tamaño de la ventana
         self.bind_events()
@@ -260,14 +262,10 @@ class TranslationEditor:
 
     def perform_ocr(self, bbox):
         cropped = self.panel_image.crop(bbox)
-        img_np = np.array(cropped)
         
-        # Aplicar escala
-        new_size = (int(img_np.shape[1] * self.current_scale), int(img_np.shape[0] * self.current_scale))
-        img_np = cv2.resize(img_np, new_size, interpolation=cv2.INTER_CUBIC)
-        
-        # Realizar OCR
-        text = pytesseract.image_to_string(Image.fromarray(img_np))
+        # Realizar OCR a la escala actual (el motor amplía el recorte y guarda
+        # el resultado en caché, así que repetir la selección no relanza Tesseract)
+        text = get_ocr_engine().image_to_string(cropped, lang='eng', scale=self.current_scale)
         
         if not text.strip():
             self.ocr_attempts += 1
@@ -710,6 +708,13 @@ class TranslationEditor:
             print(f"Processing text area {index} with bbox {bbox}")
             if index not in self.text_widgets:
                 self.create_text_widgets(index)
+        # Se encolan todos los globos sin traducción guardada ni OCR por lotes
+        # antes de esperar ninguno, para que los trabajadores los procesen en paralelo
+        engine = get_ocr_engine()
+        stored_texts = self.stored_ocr_texts()
+        ocr_futures = {index: engine.submit(self.panel_image.crop(bbox), lang='eng')
+                       for index, bbox in enumerate(self.text_areas, 1)
+                       if not self.load_saved_translation(index) and not stored_texts.get(index)}
         for index, bbox in enumerate(self.text_areas, 1):   
             if index not in self.text_widgets:
                 self.create_text_widgets(index)
@@ -723,13 +728,36 @@ class TranslationEditor:
                     self.text_widgets[index]["translations"][lang].delete(1.0, tk.END)
                     self.text_widgets[index]["translations"][lang].insert(tk.END, trans)
             else:
-                # Si no hay traducción guardada, procesar el OCR
-                cropped = self.panel_image.crop(bbox)
-                text = pytesseract.image_to_string(cropped)
+                # Si no hay traducción guardada, usar el OCR por lotes o procesar el OCR
+                text = stored_texts.get(index) or ocr_futures[index].result()
                 processed_text = self.process_text_content(text)
                 self.text_widgets[index]["original"].delete(1.0, tk.END)
                 self.text_widgets[index]["original"].insert(tk.END, processed_text)
 
+    def stored_ocr_texts(self):
+        """
+        Texto de cada globo según el OCR del cómic completo (ocr_pipeline), si
+        este panel ya se procesó con su caja actual: {índice de globo: texto}.
+        """
+        try:
+            bbox = self.comic_viewer.panel_images[self.panel]
+        except (AttributeError, IndexError):
+            return {}
+        record = get_ocr_store(self.comic_file).get(self.page, self.panel, bbox)
+        if record is None:
+            return {}
+        return {index: text_in_box(record, area) for index, area in enumerate(self.text_areas, 1)}
+
+    def show_stored_ocr(self):
+        """Rellena al instante los globos sin traducción guardada con el OCR por lotes."""
+        for index, text in self.stored_ocr_texts().items():
+            if not text or self.load_saved_translation(index):
+                continue
+            if index not in self.text_widgets:
+                self.create_text_widgets(index)
+            self.text_widgets[index]["original"].delete(1.0, tk.END)
+            self.text_widgets[index]["original"].insert(tk.END, self.process_text_content(text))
+
     def load_saved_translation(self, index):
         filename = f"{os.path.splitext(self.comic_file)[0]}_trans.json"
         if os.path.exists(filename):
@@ -760,29 +788,11 @@ class TranslationEditor:
         self.text_widgets[index] = {"original": original, "translations": translations}
 
     def detect_text_areas(self):
-        # Aumentar la resolución de la imagen
-        img = self.panel_image.resize((self.panel_image.width * 2, self.panel_image.height * 2), Image.LANCZOS)
-        
-        # Convertir a escala de grises
-        gray = img.convert('L')
-        
-        # Aplicar umbral
-        thresh = gray.point(lambda x: 0 if x < 200 else 255, '1')
-        
-        # Detectar la caja delimitadora
-        bbox = thresh.getbbox()
-        if bbox:
-            # Ampliar la caja delimitadora
-            margin = 10  # Ajustar este valor según sea necesario
-            x1, y1, x2, y2 = bbox
-            x1 = max(0, x1 - margin)
-            y1 = max(0, y1 - margin)
-            x2 = min(img.width, x2 + margin)
-            y2 = min(img.height, y2 + margin)
-            
-            # Agregar el área de texto detectada
-            self.text_areas.append((x1, y1, x2, y2))
-            self.draw_text_area((x1, y1, x2, y2), len(self.text_areas))
+        # Un área por globo detectado, en píxeles del panel (el lienzo muestra
+        # el panel a escala 1:1, igual que las áreas dibujadas a mano)
+        for bbox in detect_balloons(self.panel_image):
+            self.text_areas.append(bbox)
+            self.draw_text_area(bbox, len(self.text_areas))
 
     def draw_text_area(self, bbox, index):
         x1, y1, x2, y2 = bbox
@@ -909,6 +919,7 @@ class TranslationEditor:
         self.text_widgets = {}
         self.load_saved_translations()
         self.detect_text_areas()
+        self.show_stored_ocr()
 
     def go_to_panel(self):
         try:
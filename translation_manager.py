@@ -1,7 +1,7 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, simpledialog
 from PIL import Image, ImageTk
-import pytesseract
+from ocr_engine import get_ocr_engine
 from googletrans import Translator as GoogleTranslator
 import logging
 import requests
@@ -93,21 +93,15 @@ class TranslationManager:
     @log_function
     def perform_ocr(self):
         try:
-            text = pytesseract.image_to_string(self.panel_image, lang='eng+spa+deu')
-            boxes = pytesseract.image_to_data(self.panel_image, lang='eng+spa+deu', output_type=pytesseract.Output.DICT)
-            
-            required_keys = ['text', 'conf', 'left', 'top', 'width', 'height']
-            if not all(key in boxes for key in required_keys):
-                logger.error(f"OCR output is missing required keys: {boxes.keys()}")
-                messagebox.showerror("Error OCR", "No se pudo extraer texto de la imagen.")
-                return []
+            # Una sola pasada de Tesseract: palabras, cajas y confianzas
+            result = get_ocr_engine().recognize(self.panel_image)
     
             text_groups = []
-            for i in range(len(boxes['text'])):
-                if int(boxes['conf'][i]) > 60:
+            for word in result['words']:
+                if word['conf'] > 60:
                     text_groups.append({
-                        'text': boxes['text'][i],
-                        'box': (boxes['left'][i], boxes['top'][i], boxes['left'][i] + boxes['width'][i], boxes['top'][i] + boxes['height'][i]),
+                        'text': word['text'],
+                        'box': word['box'],
                         'group': len(text_groups) + 1
                     })
             
@@ -329,7 +323,7 @@ class ComicTranslationManager:
     @log_function
     def perform_ocr(self, image):
         try:
-            text = pytesseract.image_to_string(image, lang='eng+spa+deu')
+            text = get_ocr_engine().image_to_string(image)
             return text
         except Exception as e:
             logger.error(f"Error performing OCR: {e}", exc_info=True)
@@ -1,43 +1,214 @@
 import os
+import re
 import json
+import stat
+import tempfile
+
+# umask del proceso, leída una vez al importar (os.umask sólo se puede consultar cambiándola)
+_UMASK = os.umask(0)
+os.umask(_UMASK)
 def ensure_directory_exists(directory):
     if not os.path.exists(directory):
         os.makedirs(directory)
 
+def member_relpath(member):
+    """Ruta relativa segura para un miembro de un archivo (sin '..' ni rutas absolutas)."""
+    parts = [p for p in re.split(r'[\\/]+', member) if p not in ('', '.', '..')]
+    if parts and parts[0].endswith(':'):
+        parts = parts[1:]
+    return os.path.join(*parts) if parts else '_'
+
+def write_file_atomic(path, data):
+    """
+    Escribe en un temporal único del mismo directorio, lo vuelca a disco y lo
+    renombra: ni un corte de luz ni dos escritores a la vez dejan el archivo
+    truncado o vacío.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        ensure_directory_exists(directory)
+    tmp = tempfile.NamedTemporaryFile(dir=directory or '.', prefix=os.path.basename(path) + '.',
+                                      suffix='.part', delete=False)
+    try:
+        with tmp:
+            tmp.write(data)
+            tmp.flush()
+            os.fsync(tmp.fileno())
+        # NamedTemporaryFile crea con 0600: se conservan los permisos del
+        # archivo que se reemplaza o los que daría open() con la umask
+        try:
+            mode = stat.S_IMODE(os.stat(path).st_mode)
+        except OSError:
+            mode = 0o666 & ~_UMASK
+        os.chmod(tmp.name, mode)
+        os.replace(tmp.name, path)
+    except BaseException:
+        try:
+            os.remove(tmp.name)
+        except OSError:
+            pass
+        raise
+
+def natural_sort_key(name):
+    """Clave de orden natural: 'page2.jpg' va antes que 'page10.jpg'."""
+    return [int(part) if part.isdigit() else part for part in re.split(r'(\d+)', name.lower())]
+
+def archive_signature(archive_path):
+    st = os.stat(archive_path)
+    return {'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+
+def load_page_index(index_path):
+    if not os.path.exists(index_path):
+        return None
+    try:
+        with open(index_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (json.JSONDecodeError, OSError):
+        return None
+
+def save_page_index(index_path, index):
+    write_file_atomic(index_path, json.dumps(index, ensure_ascii=False).encode('utf-8'))
+
+def parse_gui_line(line):
+    """Convierte una línea 'pageN: x1_y1;x2_y2;...' en (N, paneles); None si no es válida."""
+    parts = line.split(':')
+    if len(parts) != 2:
+        return None
+    try:
+        page = int(parts[0].replace('page', '').strip())
+        coords = parts[1].split(';')
+        panels = []
+        for i in range(0, len(coords), 2):
+            if i+1 < len(coords):
+                x, y = coords[i].strip(), coords[i+1].strip()
+                x1, y1 = map(lambda v: int(float(v)), x.split('_'))
+                x2, y2 = map(lambda v: int(float(v)), y.split('_'))
+                panels.append((x1, y1, x2, y2))
+    except ValueError:
+        # Si hay un error al convertir los valores, se ignora la línea
+        return None
+    return page, panels
+
+def format_gui_line(page, coords):
+    coord_str = ';'.join([f"{x1}_{y1};{x2}_{y2}" for x1, y1, x2, y2 in coords])
+    return f"page{page}: {coord_str}\n"
+
+# Primera línea de los .gui escritos con páginas en orden natural. Los .gui
+# sin ella son del formato anterior (orden lexicográfico); los lectores
+# antiguos la ignoran porque no es una línea 'pageN: ...' válida.
+GUI_FORMAT_HEADER = '# comicviewer-gui 2: orden natural'
+
+def gui_journal_path(gui_path):
+    return gui_path + '.journal'
+
+def gui_is_legacy(gui_path):
+    """True si existe una instantánea .gui sin la cabecera del formato actual."""
+    try:
+        with open(gui_path, 'r') as f:
+            return f.readline().strip() != GUI_FORMAT_HEADER
+    except OSError:
+        return False
+
 def parse_gui_file(gui_path):
+    """
+    Lee la instantánea .gui y reaplica encima el diario .gui.journal, que
+    puede existir aunque todavía no haya instantánea.
+    """
     panels = {}
-    if not os.path.exists(gui_path):
-        return panels
-    
-    with open(gui_path, 'r') as f:
-        lines = f.readlines()
-        for line in lines:
+    if os.path.exists(gui_path):
+        with open(gui_path, 'r') as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    parsed = parse_gui_line(line)
+                    if parsed is not None:
+                        page, coords = parsed
+                        panels[page] = coords
+    replay_gui_journal(gui_journal_path(gui_path), panels)
+    return panels
+
+def replay_gui_journal(journal_path, panels):
+    """
+    Aplica los registros del diario sobre `panels` y devuelve cuántos había.
+    Cada registro es una línea de .gui (reemplaza la página) o '-pageN'
+    (borra la página). Una última línea sin salto de línea es una escritura
+    interrumpida y se descarta.
+    """
+    if not os.path.exists(journal_path):
+        return 0
+    count = 0
+    with open(journal_path, 'r') as f:
+        for line in f:
+            if not line.endswith('\n'):
+                break
             line = line.strip()
-            if line:
+            if line.startswith('-page'):
                 try:
-                    parts = line.split(':')
-                    if len(parts) != 2:
-                        continue
-                    page = int(parts[0].replace('page', '').strip())
-                    coords = parts[1].split(';')
-                    panels[page] = []
-                    for i in range(0, len(coords), 2):
-                        if i+1 < len(coords):
-                            x, y = coords[i].strip(), coords[i+1].strip()
-                            x1, y1 = map(lambda v: int(float(v)), x.split('_'))
-                            x2, y2 = map(lambda v: int(float(v)), y.split('_'))
-                            panels[page].append((x1, y1, x2, y2))
+                    panels.pop(int(line[len('-page'):]), None)
                 except ValueError:
-                    # Si hay un error al convertir los valores, simplemente
-                    # saltamos esta línea y continuamos con la siguiente
                     continue
-    return panels
+            else:
+                parsed = parse_gui_line(line)
+                if parsed is None:
+                    continue
+                page, coords = parsed
+                panels[page] = coords
+            count += 1
+    return count
+
+def append_gui_journal(gui_path, records):
+    """
+    Añade registros (página, paneles) al diario; paneles None borra la página.
+    El coste depende sólo de las páginas modificadas, no del cómic entero.
+    """
+    lines = [format_gui_line(page, coords) if coords is not None else f"-page{page}\n"
+             for page, coords in records]
+    with open(gui_journal_path(gui_path), 'a') as f:
+        f.write(''.join(lines))
+        f.flush()
 
 def save_gui_file(gui_path, panels):
-    with open(gui_path, 'w') as f:
-        for page, coords in panels.items():
-            coord_str = ';'.join([f"{x1}_{y1};{x2}_{y2}" for x1, y1, x2, y2 in coords])
-            f.write(f"page{page}: {coord_str}\n")
+    lines = [GUI_FORMAT_HEADER + '\n'] + [format_gui_line(page, coords) for page, coords in panels.items()]
+    # Escritura atómica: un fallo a mitad no puede truncar las correcciones
+    write_file_atomic(gui_path, ''.join(lines).encode('utf-8'))
+    # La instantánea ya incluye todo lo del diario
+    journal_path = gui_journal_path(gui_path)
+    if os.path.exists(journal_path):
+        os.remove(journal_path)
+
+def remap_translation_pages(comic_path, page_map):
+    """
+    Renumera con `page_map` las páginas de las traducciones guardadas del
+    cómic: `<cómic>_trans.json` del editor de traducción (campo 'page') y
+    `<cómic>.tra` (claves 'page_N_panel_M_group_K'). Se usa al pasar un .gui
+    antiguo a orden natural; devuelve las rutas reescritas.
+    """
+    rewritten = []
+    trans_path = f"{os.path.splitext(comic_path)[0]}_trans.json"
+    if os.path.exists(trans_path):
+        with open(trans_path, 'r', encoding='utf-8') as f:
+            items = json.load(f)
+        for item in items:
+            item['page'] = page_map.get(item['page'], item['page'])
+        write_file_atomic(trans_path, json.dumps(items, indent=4).encode('utf-8'))
+        rewritten.append(trans_path)
+
+    tra_path = f"{comic_path}.tra"
+    if os.path.exists(tra_path):
+        with open(tra_path, 'r', encoding='utf-8') as f:
+            translations = json.load(f)
+
+        def remap_key(key):
+            match = re.match(r'page_(\d+)_', key)
+            if match is None:
+                return key
+            page = int(match.group(1))
+            return f"page_{page_map.get(page, page)}_{key[match.end():]}"
+
+        translations = {remap_key(key): value for key, value in translations.items()}
+        write_file_atomic(tra_path, json.dumps(translations, ensure_ascii=False, indent=4).encode('utf-8'))
+        rewritten.append(tra_path)
+    return rewritten
             
 # def load_api_keys():
 #     keys_file = 'KEYS.json'